@@ -1,6 +1,9 @@
 #!/usr/bin/env python3
 import sys
 import unicodedata
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
 
 START, END = ord(' '), sys.maxunicode + 1           # <1>
 
@@ -12,11 +15,64 @@ def find(*query_words, start=START, end=END):       # <2>
         if name and query.issubset(name.split()):   # <6>
             print(f'U+{code:04X}\t{char}\t{name}')  # <7>
 
+def scan(queries, start=START, end=END):
+    """return a list of matching codes for each query, in one pass"""
+    by_key = defaultdict(list)  # key word -> indexes of queries with it
+    for i, query in enumerate(queries):
+        by_key[max(query, key=len)].append(i)  # longer words are rarer
+    found = [[] for _ in queries]
+    for code in range(start, end):
+        name = unicodedata.name(chr(code), None)
+        if name:
+            words = set(name.split())
+            for word in words:
+                for i in by_key.get(word, ()):
+                    if queries[i].issubset(words):
+                        found[i].append(code)
+    return found
+
+def find_batch(lines, start=START, end=END, workers=1):
+    """print matches for each query in `lines`, scanning all codes once;
+    with `workers` > 1, the scan is split among worker processes"""
+    texts = [line.strip() for line in lines if line.split()]
+    queries = [frozenset(text.upper().split()) for text in texts]
+    if workers > 1:
+        step = -(-(end - start) // (workers * 4))  # ceiling division
+        bounds = range(start, end, step)
+        with ProcessPoolExecutor(workers) as executor:
+            parts = executor.map(scan, [queries] * len(bounds), bounds,
+                                 [min(lo + step, end) for lo in bounds])
+            found = [list(chain.from_iterable(codes)) for codes in zip(*parts)]
+    else:
+        found = scan(queries, start, end)
+    for text, codes in zip(texts, found):
+        print(f'# {text}')
+        for code in codes:
+            print(f'U+{code:04X}\t{chr(code)}\t{unicodedata.name(chr(code))}')
+        sys.stdout.flush()
+
 def main(words):
-    if words:
+    if words[:1] == ['--batch']:
+        batch_main(words[1:])
+    elif words:
         find(*words)
     else:
         print('Please provide words to find.')
 
+BATCH_USAGE = 'Usage: cf.py --batch [-j WORKERS] [FILE|-]'
+
+def batch_main(args):
+    """--batch [-j WORKERS] [FILE]: one query per line, from FILE or stdin"""
+    workers = 1
+    if args[:1] == ['-j']:
+        if len(args) < 2 or not args[1].isdigit() or int(args[1]) < 1:
+            sys.exit(BATCH_USAGE)
+        workers, args = int(args[1]), args[2:]
+    if args and args[0] != '-':
+        with open(args[0], encoding='utf-8') as fp:
+            find_batch(fp, workers=workers)
+    else:
+        find_batch(sys.stdin, workers=workers)
+
 if __name__ == '__main__':
     main(sys.argv[1:])
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+
+"""
+bench.py: run the primes examples with 1 to N workers, several times
+each, and report wall time, CPU time, speedup, and efficiency.
+
+Each run is a separate Python process, so the examples are measured
+as they are used, including interpreter startup. CPU time is the user
+plus system time of that process and all its children. Speedup is
+the median wall time of ``sequential`` divided by the median wall time
+of the run; efficiency is speedup divided by the number of workers.
+The runs don't use the results cache, even if PRIMES_CACHE is set.
+
+Results are written as JSON or CSV. A JSON file saved earlier can be
+used as a baseline: runs with a median wall time more than --tolerance
+slower than the baseline are reported, and the exit status is 1.
+
+Examples::
+
+    $ ./bench.py --workers 4 --trials 3 -o baseline.json
+    $ ./bench.py --workers 4 --trials 3 --baseline baseline.json
+    $ ./bench.py --models procs proc_pool --format csv
+    $ ./bench.py --engine miller-rabin   # shows overhead, not computation
+"""
+
+import argparse
+import csv
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+from contextlib import nullcontext
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from time import perf_counter
+from typing import NamedTuple
+
+from primes import NUMBERS, engine_name
+
+HERE = Path(__file__).parent.absolute()
+
+class Model(NamedTuple):
+    script: Path
+    parallel: bool  # accepts a number of workers as argument
+    trial_only: bool = False  # ignores PRIMES_ENGINE
+
+MODELS = {
+    'sequential': Model(HERE / 'sequential.py', False),
+    'threads': Model(HERE / 'threads.py', True),
+    'procs': Model(HERE / 'procs.py', True),
+    'procs_chunked': Model(HERE / 'procs_chunked.py', True),
+    'procs_steal': Model(HERE / 'procs_steal.py', True),
+    'procs_shm': Model(HERE / 'procs_shm.py', True),
+    'py36': Model(HERE / 'py36' / 'procs.py', True, trial_only=True),
+    'proc_pool': Model(HERE.parent.parent / '20-executors' / 'primes' / 'proc_pool.py', True),
+}
+BASELINE_MODEL = 'sequential'
+TOLERANCE = 0.10  # fraction of the baseline time
+
+@dataclass
+class Row:
+    model: str
+    workers: int
+    trials: int
+    wall: float  # median, in seconds
+    wall_min: float
+    cpu: float  # median
+    speedup: float = 0.0
+    efficiency: float = 0.0
+
+def children_cpu() -> float:
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+def run_once(model: Model, workers: int, env: dict[str, str]) -> tuple[float, float]:
+    """return wall time and CPU time of one run"""
+    args = [sys.executable, str(model.script)]
+    if model.parallel:
+        args.append(str(workers))
+    cpu0 = children_cpu()
+    t0 = perf_counter()
+    subprocess.run(args, cwd=model.script.parent, env=env, check=True,
+                   stdout=subprocess.DEVNULL)
+    return perf_counter() - t0, children_cpu() - cpu0
+
+def measure(name: str, workers: int, trials: int, env: dict[str, str]) -> Row:
+    walls, cpus = [], []
+    for trial in range(1, trials + 1):
+        wall, cpu = run_once(MODELS[name], workers, env)
+        print(f'{name:>14} {workers:3} workers, trial {trial}:'
+              f' {wall:7.2f}s wall {cpu:7.2f}s CPU', file=sys.stderr)
+        walls.append(wall)
+        cpus.append(cpu)
+    return Row(name, workers, trials, statistics.median(walls), min(walls),
+               statistics.median(cpus))
+
+def bench(models: list[str], max_workers: int, trials: int,
+          env: dict[str, str], engine: str) -> list[Row]:
+    rows = [measure(BASELINE_MODEL, 1, trials, env)]
+    for name in models:
+        if name == BASELINE_MODEL:
+            continue
+        if MODELS[name].trial_only and engine != 'trial':
+            print(f'Skipping {name}: it only has the trial engine.', file=sys.stderr)
+            continue
+        for workers in range(1, max_workers + 1):
+            rows.append(measure(name, workers, trials, env))
+    base_wall = rows[0].wall
+    for row in rows:
+        row.speedup = base_wall / row.wall
+        row.efficiency = row.speedup / row.workers
+    return rows
+
+def regressions(rows: list[Row], baseline: list[dict],
+                tolerance: float) -> list[str]:
+    """describe runs slower than the same model and workers in `baseline`"""
+    before = {(r['model'], r['workers']): r['wall'] for r in baseline}
+    found = []
+    for row in rows:
+        old = before.get((row.model, row.workers))
+        if old and row.wall > old * (1 + tolerance):
+            found.append(f'{row.model} with {row.workers} workers:'
+                         f' {old:.2f}s -> {row.wall:.2f}s'
+                         f' ({row.wall / old - 1:+.0%})')
+    return found
+
+def write_json(rows: list[Row], engine: str, out) -> None:
+    report = {
+        'engine': engine,
+        'numbers': len(NUMBERS),
+        'cpu_count': os.cpu_count(),
+        'python': sys.version.split()[0],
+        'results': [asdict(row) for row in rows],
+    }
+    json.dump(report, out, indent=2)
+    out.write('\n')
+
+def write_csv(rows: list[Row], out) -> None:
+    writer = csv.DictWriter(out, fieldnames=list(asdict(rows[0])))
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(asdict(row))
+
+def main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark the primes examples.')
+    parser.add_argument('--models', nargs='+', choices=list(MODELS),
+                        default=list(MODELS), metavar='MODEL',
+                        help=f'models to run (default: all of {", ".join(MODELS)})')
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count(),
+                        help='run parallel models with 1 to WORKERS workers'
+                             ' (default: CPU count)')
+    parser.add_argument('-t', '--trials', type=int, default=3,
+                        help='runs of each model and number of workers (default: 3)')
+    parser.add_argument('--engine', help='primality engine, overriding PRIMES_ENGINE')
+    parser.add_argument('-f', '--format', choices=['json', 'csv'], default='json')
+    parser.add_argument('-o', '--output', type=Path,
+                        help='write results to this file (default: stdout)')
+    parser.add_argument('--baseline', type=Path,
+                        help='JSON results of an earlier run to compare against')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE,
+                        help=f'slowdown reported as regression (default: {TOLERANCE})')
+    args = parser.parse_args(argv)
+
+    env = dict(os.environ)
+    if env.pop('PRIMES_CACHE', None):  # measure the engines, not cache lookups
+        print('PRIMES_CACHE is set: running without the cache.', file=sys.stderr)
+    if args.engine:
+        env['PRIMES_ENGINE'] = args.engine
+    engine = env.get('PRIMES_ENGINE') or engine_name()
+
+    rows = bench(args.models, args.workers, args.trials, env, engine)
+    with (args.output.open('w', newline='') if args.output
+          else nullcontext(sys.stdout)) as out:
+        if args.format == 'json':
+            write_json(rows, engine, out)
+        else:
+            write_csv(rows, out)
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text())
+        if baseline['engine'] != engine:
+            print(f'Baseline engine is {baseline["engine"]!r}, not {engine!r}:'
+                  ' skipping comparison.', file=sys.stderr)
+        elif slower := regressions(rows, baseline['results'], args.tolerance):
+            print('Regressions:', *slower, sep='\n  ', file=sys.stderr)
+            return 1
+        else:
+            print('No regressions.', file=sys.stderr)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+
+"""
+primecache.py: a persistent cache of primality results, in SQLite.
+
+Set the PRIMES_CACHE environment variable to the path of a cache file,
+and `primes.get_engine` returns the selected engine wrapped by `cached`:
+known numbers cost a lookup, and new results are saved for later runs.
+The same file may be used by many processes at once: the database is
+in WAL mode, so readers don't block each other or the writer::
+
+    $ PRIMES_CACHE=primes.db python3 procs.py 4   # computes and saves
+    $ PRIMES_CACHE=primes.db python3 procs.py 4   # only lookups
+    $ python3 primecache.py primes.db             # hit ratio
+
+The cache holds about `max_entries` results. Each result is saved with
+the time it took to compute, and the cheapest results are evicted first,
+because they are the cheapest to compute again. Numbers that don't fit
+in a signed 64-bit integer, the SQLite integer type, are not cached.
+
+Hits and misses are counted in each process, and added to totals in
+the database when the process exits.
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import threading
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from multiprocessing import util
+from time import perf_counter
+from typing import NamedTuple
+
+MAX_ENTRIES = 1_000_000
+EVICT_EVERY = 100  # new entries saved by a process between evictions
+BUSY_TIMEOUT = 10.0  # seconds to wait for another process to commit
+MAX_KEY = 2 ** 63 - 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    n INTEGER PRIMARY KEY,
+    prime INTEGER NOT NULL,
+    elapsed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_by_elapsed ON results (elapsed);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO counters VALUES ('hits', 0), ('misses', 0);
+"""
+
+class CacheStats(NamedTuple):
+    entries: int
+    hits: int
+    misses: int
+
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+class PrimeCache:
+    """primality results in an SQLite file; each process that uses
+    an instance, including forked copies, gets its own connection,
+    shared by its threads"""
+
+    def __init__(self, path: str | os.PathLike, max_entries: int = MAX_ENTRIES):
+        self.path = os.fspath(path)
+        self.max_entries = max_entries
+        self._pid = 0
+        self._reset()
+
+    def _reset(self) -> None:
+        """forget state inherited from another process"""
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.RLock()
+        self.hits = self.misses = 0  # not yet added to the counters table
+        self._saved = 0  # entries saved since the last eviction
+
+    @contextmanager
+    def _connection(self) -> Iterator[sqlite3.Connection]:
+        if self._pid != os.getpid():
+            # after fork, the parent connection must not be used, or closed
+            self._reset()
+            self._pid = os.getpid()
+        with self._lock:
+            if self._conn is None:
+                self._conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT,
+                                             isolation_level=None,
+                                             check_same_thread=False)
+                self._conn.execute('PRAGMA journal_mode=WAL')
+                self._conn.execute('PRAGMA synchronous=NORMAL')
+                self._conn.executescript(SCHEMA)
+                # run at exit of the main process, or of a multiprocessing worker
+                util.Finalize(self, self.close, exitpriority=10)
+            yield self._conn
+
+    def get(self, n: int) -> bool | None:
+        """cached result for `n`, or None"""
+        if n > MAX_KEY:
+            return None
+        with self._connection() as conn:
+            row = conn.execute('SELECT prime FROM results WHERE n = ?',
+                               (n,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return bool(row[0])
+
+    def put(self, n: int, prime: bool, elapsed: float) -> None:
+        if n > MAX_KEY:
+            return
+        with self._connection() as conn:
+            conn.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?)',
+                         (n, prime, elapsed))
+            self._saved += 1
+            if self._saved >= EVICT_EVERY:
+                self.evict()
+
+    def evict(self) -> int:
+        """delete the cheapest results over `max_entries`; return how many"""
+        with self._connection() as conn, conn:
+            self._saved = 0
+            # one write transaction, so concurrent evictions don't overlap
+            conn.execute('BEGIN IMMEDIATE')
+            (count,) = conn.execute('SELECT count(*) FROM results').fetchone()
+            excess = count - self.max_entries
+            if excess > 0:
+                conn.execute('DELETE FROM results WHERE n IN'
+                             ' (SELECT n FROM results ORDER BY elapsed LIMIT ?)',
+                             (excess,))
+        return max(excess, 0)
+
+    def flush(self) -> None:
+        """add the hits and misses of this process to the totals"""
+        with self._connection() as conn:
+            if self.hits or self.misses:
+                with conn:
+                    conn.execute('BEGIN IMMEDIATE')
+                    conn.executemany(
+                        'UPDATE counters SET value = value + ? WHERE name = ?',
+                        [(self.hits, 'hits'), (self.misses, 'misses')])
+                self.hits = self.misses = 0
+
+    def stats(self) -> CacheStats:
+        """totals from the database, including this process"""
+        self.flush()
+        with self._connection() as conn:
+            (entries,) = conn.execute('SELECT count(*) FROM results').fetchone()
+            counters = dict(conn.execute('SELECT name, value FROM counters'))
+        return CacheStats(entries, counters['hits'], counters['misses'])
+
+    def reset_stats(self) -> None:
+        with self._connection() as conn:
+            self.hits = self.misses = 0
+            conn.execute('UPDATE counters SET value = 0')
+
+    def close(self) -> None:
+        if self._conn is not None and self._pid == os.getpid():
+            self.flush()
+            with self._lock:
+                self._conn.close()
+                self._conn = None
+
+def cached(engine: Callable[[int], bool], cache: PrimeCache) -> Callable[[int], bool]:
+    """wrap a primality `engine` with lookups in `cache`"""
+    def is_prime(n: int) -> bool:
+        if (prime := cache.get(n)) is not None:
+            return prime
+        t0 = perf_counter()
+        prime = engine(n)
+        cache.put(n, prime, perf_counter() - t0)
+        return prime
+    return is_prime
+
+def main(argv: list[str]) -> None:
+    parser = argparse.ArgumentParser(description='Show primality cache stats.')
+    parser.add_argument('path', nargs='?', default=os.environ.get('PRIMES_CACHE'),
+                        help='cache file (default: PRIMES_CACHE)')
+    parser.add_argument('--max-entries', type=int, default=MAX_ENTRIES,
+                        help=f'evict down to this size (default: {MAX_ENTRIES})')
+    parser.add_argument('--evict', action='store_true',
+                        help='evict entries over --max-entries now')
+    parser.add_argument('--reset-stats', action='store_true',
+                        help='set hits and misses to zero')
+    args = parser.parse_args(argv)
+    if not args.path:
+        parser.error('no cache file given, and PRIMES_CACHE is not set')
+
+    cache = PrimeCache(args.path, args.max_entries)
+    if args.evict:
+        print(f'{cache.evict()} entries evicted')
+    if args.reset_stats:
+        cache.reset_stats()
+    entries, hits, misses = stats = cache.stats()
+    print(f'{entries} entries, {hits} hits, {misses} misses:'
+          f' {stats.hit_ratio:.1%} hit ratio')
+    cache.close()
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
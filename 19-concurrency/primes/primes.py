@@ -1,6 +1,9 @@
 #!/usr/bin/env python3
 
 import math
+import os
+import random
+from collections.abc import Callable
 
 PRIME_FIXTURE = [
     (2, True),
@@ -43,9 +46,78 @@ def is_prime(n: int) -> bool:
     return True
 # end::IS_PRIME[]
 
+# Testing these bases is enough to prove primality for n < MR_LIMIT,
+# which covers all 64-bit integers.
+MR_BASES = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37)
+MR_LIMIT = 318_665_857_834_031_151_167_461
+# Random bases also tested for n >= MR_LIMIT: a composite passes each
+# with probability at most 1/4, so all of them with less than 4**-20.
+MR_EXTRA_ROUNDS = 20
+
+def is_prime_mr(n: int) -> bool:
+    """Miller-Rabin test: deterministic for n < MR_LIMIT, probabilistic
+    above, with MR_EXTRA_ROUNDS random bases besides MR_BASES
+
+    >>> all(is_prime_mr(n) == prime for n, prime in PRIME_FIXTURE)
+    True
+    >>> is_prime_mr(MR_LIMIT)  # passes the test for all of MR_BASES
+    False
+    >>> is_prime_mr(2 ** 89 - 1)
+    True
+    """
+    if n < 2:
+        return False
+    for p in MR_BASES:
+        if n % p == 0:
+            return n == p
+    bases = list(MR_BASES)
+    if n >= MR_LIMIT:
+        bases.extend(random.randrange(2, n - 1) for _ in range(MR_EXTRA_ROUNDS))
+
+    d, s = n - 1, 0  # n - 1 == d * 2**s, with d odd
+    while d % 2 == 0:
+        d //= 2
+        s += 1
+    for a in bases:
+        x = pow(a, d, n)
+        if x == 1 or x == n - 1:
+            continue
+        for _ in range(s - 1):
+            x = x * x % n
+            if x == n - 1:
+                break
+        else:
+            return False  # a proves n is composite
+    return True
+
+ENGINES: dict[str, Callable[[int], bool]] = {
+    'trial': is_prime,  # slow on purpose: the demos need CPU-bound work
+    'miller-rabin': is_prime_mr,
+}
+DEFAULT_ENGINE = 'trial'
+
+def engine_name() -> str:
+    """engine selected by the PRIMES_ENGINE environment variable"""
+    return os.environ.get('PRIMES_ENGINE', DEFAULT_ENGINE)
+
+def get_engine(name: str | None = None) -> Callable[[int], bool]:
+    """engine called `name`, or selected by PRIMES_ENGINE; wrapped with
+    a persistent cache if PRIMES_CACHE names a file (see primecache.py)"""
+    name = name or engine_name()
+    try:
+        engine = ENGINES[name]
+    except KeyError:
+        choices = ', '.join(ENGINES)
+        raise ValueError(f'unknown primes engine {name!r}; choose from: {choices}') from None
+    if cache_path := os.environ.get('PRIMES_CACHE'):
+        from primecache import PrimeCache, cached
+        return cached(engine, PrimeCache(cache_path))
+    return engine
+
 if __name__ == '__main__':
 
-    for n, prime in PRIME_FIXTURE:
-        prime_res = is_prime(n)
-        assert prime_res == prime
-        print(n, prime)
+    for name, engine in ENGINES.items():
+        for n, prime in PRIME_FIXTURE:
+            prime_res = engine(n)
+            assert prime_res == prime
+            print(name, n, prime)
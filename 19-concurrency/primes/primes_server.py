@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+
+"""
+primes_server.py: an asyncio TCP service checking primes in a
+`ProcessPoolExecutor`, so the event loop never runs `is_prime`,
+and stays responsive while all worker processes are busy.
+
+Clients send one number per line, and may send many lines without
+waiting for replies: each reply says which number it is about,
+in the order checks complete. Sending ``stats`` returns a summary.
+
+Each reply shows how long the check waited to start in a worker
+process, and how long it took to compute::
+
+    $ nc localhost 2323
+    9999999999999917
+    5
+    5 P wait=0.000143s compute=0.000003s
+    9999999999999917 P wait=0.000371s compute=3.217834s
+    stats
+    # 2 requests, 2 checks, 0 coalesced, 0 rejected, 0 pending;
+    wait avg=0.000257s max=0.000371s; compute avg=1.608919s
+
+Requests for a number that is already being checked are coalesced:
+they wait for the same result, marked with ``*``. At most
+`max_pending` different numbers are checked or queued at once;
+more are rejected at once, with a ``busy`` reply.
+"""
+
+import argparse
+import asyncio
+import functools
+import sys
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass
+from time import perf_counter
+from typing import NamedTuple
+
+from primes import engine_name, get_engine
+
+is_prime = get_engine()  # set PRIMES_ENGINE to choose
+
+DEFAULT_PORT = 2323
+MAX_PENDING = 100  # numbers being checked or waiting for a worker
+MAX_LINE = 64  # bytes in a request line
+MAX_NUMBER = 2 ** 64 - 1
+
+def check(n: int) -> tuple[bool, float]:
+    """run in a worker process: return result and compute time"""
+    t0 = perf_counter()
+    prime = is_prime(n)
+    return prime, perf_counter() - t0
+
+class Reply(NamedTuple):
+    n: int
+    prime: bool
+    wait: float  # seconds from submission to the start of the check
+    compute: float
+    coalesced: bool = False
+
+    def __str__(self) -> str:
+        label = 'P' if self.prime else ' '
+        mark = '*' if self.coalesced else ''
+        return (f'{self.n}{mark} {label} wait={self.wait:.6f}s'
+                f' compute={self.compute:.6f}s')
+
+class Busy(Exception):
+    """too many numbers pending"""
+
+@dataclass
+class Stats:
+    requests: int = 0
+    coalesced: int = 0
+    rejected: int = 0
+    checks: int = 0
+    wait_total: float = 0.0
+    wait_max: float = 0.0
+    compute_total: float = 0.0
+
+    def record(self, wait: float, compute: float) -> None:
+        self.checks += 1
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+        self.compute_total += compute
+
+    def report(self, pending: int) -> str:
+        checks = self.checks or 1
+        return (f'# {self.requests} requests, {self.checks} checks,'
+                f' {self.coalesced} coalesced, {self.rejected} rejected,'
+                f' {pending} pending;\n'
+                f'wait avg={self.wait_total / checks:.6f}s max={self.wait_max:.6f}s;'
+                f' compute avg={self.compute_total / checks:.6f}s')
+
+class PrimeService:
+    def __init__(self, executor: Executor, max_pending: int = MAX_PENDING):
+        self.executor = executor
+        self.max_pending = max_pending
+        self.pending: dict[int, asyncio.Future[Reply]] = {}
+        self.stats = Stats()
+
+    async def check(self, n: int) -> Reply:
+        self.stats.requests += 1
+        if (future := self.pending.get(n)) is not None:
+            self.stats.coalesced += 1
+            reply = await asyncio.shield(future)
+            return reply._replace(coalesced=True)
+        if len(self.pending) >= self.max_pending:
+            self.stats.rejected += 1
+            raise Busy(f'{len(self.pending)} numbers pending')
+        future = asyncio.ensure_future(self._run(n))
+        self.pending[n] = future
+        future.add_done_callback(lambda _: self.pending.pop(n, None))
+        # shield: if this client goes away, others may be waiting too
+        return await asyncio.shield(future)
+
+    async def _run(self, n: int) -> Reply:
+        loop = asyncio.get_running_loop()
+        t0 = perf_counter()
+        prime, compute = await loop.run_in_executor(self.executor, check, n)
+        # time spent in the queue, and sending the job and result
+        wait = perf_counter() - t0 - compute
+        self.stats.record(wait, compute)
+        return Reply(n, prime, wait, compute)
+
+async def answer(service: PrimeService, text: str,
+                 writer: asyncio.StreamWriter) -> None:
+    try:
+        n = int(text)
+        if not 0 <= n <= MAX_NUMBER:
+            raise ValueError
+    except ValueError:
+        line = f'{text!r}: expected an integer from 0 to {MAX_NUMBER}'
+    else:
+        try:
+            line = str(await service.check(n))
+        except Busy as exc:
+            line = f'{n} busy: {exc}'
+    writer.write(line.encode() + b'\n')
+    await writer.drain()
+
+async def handle(service: PrimeService, reader: asyncio.StreamReader,
+                 writer: asyncio.StreamWriter) -> None:
+    answers: set[asyncio.Task] = set()
+    try:
+        while line := await reader.readline():
+            if not (text := line.decode(errors='replace').strip()):
+                break
+            if text == 'stats':
+                report = service.stats.report(len(service.pending))
+                writer.write(report.encode() + b'\n')
+                continue
+            task = asyncio.create_task(answer(service, text, writer))
+            answers.add(task)
+            task.add_done_callback(answers.discard)
+        await asyncio.gather(*answers)  # reply to all, then close
+    except (ConnectionError, ValueError):  # ValueError: line too long
+        for task in answers:
+            task.cancel()
+    finally:
+        writer.close()
+
+async def serve(host: str, port: int, executor: Executor, max_pending: int) -> None:
+    service = PrimeService(executor, max_pending)
+    # Start the worker processes before listening: workers forked later
+    # would inherit the sockets of connected clients, keeping them open.
+    await asyncio.get_running_loop().run_in_executor(executor, check, 2)
+    server = await asyncio.start_server(
+        functools.partial(handle, service), host, port, limit=MAX_LINE)
+    addr = server.sockets[0].getsockname()
+    print(f'Serving on {addr} ({engine_name()}). Hit CTRL-C to stop.')
+    async with server:
+        await server.serve_forever()
+
+def main(argv: list[str]) -> None:
+    parser = argparse.ArgumentParser(description='Serve primality checks over TCP.')
+    parser.add_argument('host', nargs='?', default='127.0.0.1')
+    parser.add_argument('port', nargs='?', type=int, default=DEFAULT_PORT)
+    parser.add_argument('-w', '--workers', type=int,
+                        help='worker processes (default: CPU count)')
+    parser.add_argument('--max-pending', type=int, default=MAX_PENDING,
+                        help=f'numbers checked or queued at once (default: {MAX_PENDING})')
+    args = parser.parse_args(argv)
+    executor = ProcessPoolExecutor(args.workers)
+    try:
+        asyncio.run(serve(args.host, args.port, executor, args.max_pending))
+    except KeyboardInterrupt:
+        print('\nServer shut down.')
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
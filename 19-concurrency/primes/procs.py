@@ -12,7 +12,9 @@ from typing import NamedTuple
 from multiprocessing import Process, SimpleQueue, cpu_count  # <1>
 from multiprocessing import queues  # <2>
 
-from primes import is_prime, NUMBERS
+from primes import NUMBERS, engine_name, get_engine
+
+is_prime = get_engine()  # set PRIMES_ENGINE to choose
 
 class PrimeResult(NamedTuple):  # <3>
     n: int
@@ -50,7 +52,7 @@ def main() -> None:
     else:
         procs = int(sys.argv[1])
 
-    print(f'Checking {len(NUMBERS)} numbers with {procs} processes:')
+    print(f'Checking {len(NUMBERS)} numbers with {procs} processes ({engine_name()}):')
     t0 = perf_counter()
     jobs: JobQueue = SimpleQueue()  # <2>
     results: ResultQueue = SimpleQueue()
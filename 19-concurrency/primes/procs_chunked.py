@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+
+"""
+procs_chunked.py: a version of procs.py sending jobs and results
+between processes in chunks, so that the cost of pickling and
+pipe round-trips is paid once per chunk instead of once per number.
+
+The chunk size is fixed with --chunk, or adapted to the measured
+time per number, aiming at TARGET_CHUNK_TIME seconds of work per chunk.
+Chunks get smaller near the end of the job list, to keep all
+processes busy until the end.
+
+Examples::
+
+    $ ./procs_chunked.py 4                    # NUMBERS from primes.py
+    $ ./procs_chunked.py 4 --upto 2000000 -q  # many small numbers
+    $ ./procs_chunked.py 4 --upto 2000000 -q --chunk 1
+"""
+
+import argparse
+import itertools
+import sys
+from collections.abc import Iterator, Sequence
+from multiprocessing import Process, Queue, SimpleQueue, cpu_count, queues
+from time import perf_counter
+from typing import NamedTuple
+
+from primes import NUMBERS, engine_name, get_engine
+
+is_prime = get_engine()  # set PRIMES_ENGINE to choose
+
+TARGET_CHUNK_TIME = 0.05  # seconds of work per chunk, with adaptive sizing
+MAX_CHUNK = 10_000
+CHUNKS_PER_PROC = 2  # chunks queued for each process at any time
+
+class PrimeResult(NamedTuple):
+    n: int
+    prime: bool
+    elapsed: float
+
+class ChunkResult(NamedTuple):
+    results: list[PrimeResult]
+    elapsed: float
+
+# A Queue, not a SimpleQueue: its feeder thread keeps put() from blocking
+# while a large chunk waits in the pipe, which could deadlock with a
+# worker blocked on sending results to the main process.
+JobQueue = queues.Queue  # of list[int] chunks; not subscriptable at runtime
+ResultQueue = queues.SimpleQueue[ChunkResult]
+
+def check(n: int) -> PrimeResult:
+    t0 = perf_counter()
+    res = is_prime(n)
+    return PrimeResult(n, res, perf_counter() - t0)
+
+def worker(jobs: JobQueue, results: ResultQueue) -> None:
+    while chunk := jobs.get():  # an empty chunk means stop
+        t0 = perf_counter()
+        checked = [check(n) for n in chunk]
+        results.put(ChunkResult(checked, perf_counter() - t0))
+    results.put(ChunkResult([], 0.0))
+
+class ChunkSizer:
+    """fixed chunk size, or adapted to the measured time per number"""
+
+    def __init__(self, procs: int, fixed: int | None = None):
+        self.procs = procs
+        self.fixed = fixed
+        self.per_item: float | None = None  # moving average, in seconds
+
+    def next_size(self, remaining: int) -> int:
+        if self.fixed:
+            return self.fixed
+        if self.per_item is None:
+            return 1  # no measurement yet
+        size = int(TARGET_CHUNK_TIME / self.per_item) if self.per_item else MAX_CHUNK
+        fair_share = -(-remaining // (self.procs * CHUNKS_PER_PROC))  # ceiling division
+        return max(1, min(size, fair_share, MAX_CHUNK))
+
+    def update(self, result: ChunkResult) -> None:
+        if self.fixed or not result.results:
+            return
+        per_item = result.elapsed / len(result.results)
+        if self.per_item is None:
+            self.per_item = per_item
+        else:
+            self.per_item = 0.75 * self.per_item + 0.25 * per_item
+
+class Stats(NamedTuple):
+    checked: int
+    primes: int
+    chunks: int
+
+def run(numbers: Sequence[int], procs: int, sizer: ChunkSizer,
+        quiet: bool = False) -> Stats:
+    jobs: JobQueue = Queue()
+    results: ResultQueue = SimpleQueue()
+    for _ in range(procs):
+        Process(target=worker, args=(jobs, results)).start()
+
+    pending: Iterator[int] = iter(numbers)
+    remaining = len(numbers)
+    in_flight = 0
+
+    def submit() -> None:
+        nonlocal remaining, in_flight
+        size = min(sizer.next_size(remaining), remaining)
+        jobs.put(list(itertools.islice(pending, size)))
+        remaining -= size
+        in_flight += 1
+
+    checked = primes = chunks = 0
+    while remaining and in_flight < procs * CHUNKS_PER_PROC:
+        submit()
+    while in_flight:
+        result = results.get()
+        in_flight -= 1
+        chunks += 1
+        sizer.update(result)
+        if remaining:
+            submit()
+        for n, prime, elapsed in result.results:
+            checked += 1
+            primes += prime
+            if not quiet:
+                label = 'P' if prime else ' '
+                print(f'{n:16}  {label} {elapsed:9.6f}s')
+
+    for _ in range(procs):
+        jobs.put([])
+    for _ in range(procs):  # wait for the sentinels
+        results.get()
+    return Stats(checked, primes, chunks)
+
+def main(argv: list[str]) -> None:
+    parser = argparse.ArgumentParser(description='Check primes in chunks.')
+    parser.add_argument('procs', nargs='?', type=int, default=cpu_count())
+    parser.add_argument('--chunk', type=int, metavar='SIZE',
+                        help='fixed chunk size (default: adaptive)')
+    parser.add_argument('--upto', type=int, metavar='N',
+                        help='check numbers from 2 to N, instead of NUMBERS')
+    parser.add_argument('-q', '--quiet', action='store_true',
+                        help="don't print a line per number")
+    args = parser.parse_args(argv)
+    if args.chunk is not None and args.chunk < 1:
+        parser.error('--chunk must be at least 1')
+
+    numbers: Sequence[int] = range(2, args.upto + 1) if args.upto else NUMBERS
+    sizing = f'chunks of {args.chunk}' if args.chunk else 'adaptive chunks'
+    print(f'Checking {len(numbers)} numbers with {args.procs} processes,'
+          f' {sizing} ({engine_name()}):')
+    t0 = perf_counter()
+    sizer = ChunkSizer(args.procs, args.chunk)
+    checked, primes, chunks = run(numbers, args.procs, sizer, args.quiet)
+    elapsed = perf_counter() - t0
+    average = checked / chunks if chunks else 0.0
+    print(f'{checked} checks in {elapsed:.2f}s: {primes} primes, {chunks} chunks'
+          f' of {average:.1f} numbers on average')
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
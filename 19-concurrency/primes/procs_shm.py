@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+
+"""
+procs_shm.py: a version of procs.py with no pickling of jobs or results.
+
+The numbers to check, and the results, live in one block of
+`multiprocessing.shared_memory`, as three arrays indexed by job position:
+the numbers, the time taken by each check, and a flag for each number.
+Workers claim job positions from a shared counter, and write each result
+in place. The main process does not receive any results: it waits for
+an event set by the worker that completes the last job, then reads the
+arrays directly.
+
+Examples::
+
+    $ ./procs_shm.py 4                    # NUMBERS from primes.py
+    $ ./procs_shm.py 4 --upto 2000000 -q  # many small numbers
+"""
+
+import argparse
+import sys
+from collections.abc import Sequence
+from multiprocessing import Event, Process, Value, cpu_count
+from multiprocessing.shared_memory import SharedMemory
+from multiprocessing.synchronize import Event as EventType
+from time import perf_counter
+from typing import Any
+
+from primes import NUMBERS, engine_name, get_engine
+
+is_prime = get_engine()  # set PRIMES_ENGINE to choose
+
+PENDING, COMPOSITE, PRIME = 0, 1, 2  # values of the flags array
+POLL_INTERVAL = 0.5  # seconds between checks that workers are alive
+ITEM_SIZE = 8 + 8 + 1  # number ('Q'), elapsed ('d'), flag ('B')
+
+class ResultArrays:
+    """views of the jobs and results arrays in a shared memory block"""
+
+    def __init__(self, shm: SharedMemory, count: int):
+        self.count = count
+        buf = shm.buf
+        self.numbers = buf[:8 * count].cast('Q')
+        self.elapsed = buf[8 * count:16 * count].cast('d')
+        self.flags = buf[16 * count:ITEM_SIZE * count].cast('B')
+
+    def release(self) -> None:
+        """release views, so that the shared memory can be closed"""
+        for view in (self.numbers, self.elapsed, self.flags):
+            view.release()
+
+def worker(shm_name: str, count: int, next_job: Any, done: Any,
+           all_done: EventType) -> None:
+    shm = SharedMemory(shm_name)
+    arrays = ResultArrays(shm, count)
+    try:
+        while True:
+            with next_job.get_lock():
+                i = next_job.value
+                next_job.value += 1
+            if i >= count:
+                break
+            t0 = perf_counter()
+            prime = is_prime(arrays.numbers[i])
+            arrays.elapsed[i] = perf_counter() - t0
+            arrays.flags[i] = PRIME if prime else COMPOSITE
+            with done.get_lock():
+                done.value += 1
+                if done.value == count:
+                    all_done.set()
+    finally:
+        arrays.release()
+        shm.close()
+
+def run(numbers: Sequence[int], procs: int, quiet: bool = False) -> int:
+    """check all numbers, print results in job order, return number of primes"""
+    count = len(numbers)
+    shm = SharedMemory(create=True, size=max(ITEM_SIZE * count, 1))
+    arrays = ResultArrays(shm, count)
+    try:
+        for i, n in enumerate(numbers):
+            arrays.numbers[i] = n
+        next_job, done = Value('q', 0), Value('q', 0)
+        all_done = Event()
+        if count == 0:
+            all_done.set()
+        workers = [Process(target=worker,
+                           args=(shm.name, count, next_job, done, all_done))
+                   for _ in range(procs)]
+        for proc in workers:
+            proc.start()
+        while not all_done.wait(POLL_INTERVAL):
+            if failed := [proc for proc in workers if proc.exitcode]:
+                for proc in workers:
+                    proc.terminate()
+                codes = ', '.join(str(proc.exitcode) for proc in failed)
+                raise RuntimeError(f'{len(failed)} worker(s) failed, exit code(s): {codes};'
+                                   f' {done.value} of {count} checks done')
+        for proc in workers:
+            proc.join()
+        primes = sum(1 for flag in arrays.flags if flag == PRIME)
+        if not quiet:
+            for n, elapsed, flag in zip(arrays.numbers, arrays.elapsed, arrays.flags):
+                label = 'P' if flag == PRIME else ' '
+                print(f'{n:16}  {label} {elapsed:9.6f}s')
+        return primes
+    finally:
+        arrays.release()
+        shm.close()
+        shm.unlink()
+
+def main(argv: list[str]) -> None:
+    parser = argparse.ArgumentParser(
+        description='Check primes, with results in shared memory.')
+    parser.add_argument('procs', nargs='?', type=int, default=cpu_count())
+    parser.add_argument('--upto', type=int, metavar='N',
+                        help='check numbers from 2 to N, instead of NUMBERS')
+    parser.add_argument('-q', '--quiet', action='store_true',
+                        help="don't print a line per number")
+    args = parser.parse_args(argv)
+
+    numbers: Sequence[int] = range(2, args.upto + 1) if args.upto else NUMBERS
+    print(f'Checking {len(numbers)} numbers with {args.procs} processes'
+          f' and shared memory ({engine_name()}):')
+    t0 = perf_counter()
+    try:
+        primes = run(numbers, args.procs, args.quiet)
+    except RuntimeError as exc:
+        sys.exit(f'Stopped: {exc}')
+    elapsed = perf_counter() - t0
+    print(f'{len(numbers)} checks in {elapsed:.2f}s: {primes} primes')
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
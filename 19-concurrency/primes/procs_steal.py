@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+
+"""
+procs_steal.py: a version of procs.py with a work-stealing scheduler.
+
+Instead of one shared job queue, each worker process gets its own
+deque of jobs, packed so that the estimated cost of every deque is
+about the same. A worker takes jobs from the front of its own deque;
+when it runs out, it steals from the back of another worker's deque,
+so a wrong cost estimate can't leave processes idle while others
+still have work.
+
+The deques live in shared memory: one array of numbers, with the head
+and tail of each deque in another shared array, guarded by one lock
+per deque. At the end, a table shows how busy each worker was.
+"""
+
+import heapq
+import sys
+from multiprocessing import Lock, Process, SimpleQueue, cpu_count, queues
+from multiprocessing.sharedctypes import RawArray
+from time import perf_counter
+from typing import Any, NamedTuple
+
+from primes import NUMBERS, engine_name, get_engine
+
+is_prime = get_engine()  # set PRIMES_ENGINE to choose
+
+class PrimeResult(NamedTuple):
+    n: int
+    prime: bool
+    elapsed: float
+    worker: int
+    stolen: bool
+
+class WorkerStats(NamedTuple):
+    worker: int
+    jobs: int
+    stolen: int
+    busy: float  # seconds spent checking numbers
+    elapsed: float  # seconds from start to finish of the worker
+
+ResultQueue = queues.SimpleQueue  # of PrimeResult, then one WorkerStats per worker
+
+def estimate_cost(n: int, engine: str) -> float:
+    """relative cost of checking `n`, from its bit length"""
+    if n < 3 or n % 2 == 0:
+        return 1.0  # rejected at once
+    bits = n.bit_length()
+    if engine == 'trial':
+        return 2.0 ** (bits / 2)  # up to sqrt(n) divisions
+    return float(bits ** 3)  # modular exponentiations
+
+def pack(numbers: list[int], workers: int, engine: str) -> list[list[int]]:
+    """split `numbers` in `workers` lists of similar total cost,
+    placing the costliest jobs first (longest processing time first)"""
+    by_cost = sorted(numbers, key=lambda n: estimate_cost(n, engine), reverse=True)
+    loads = [(0.0, i) for i in range(workers)]  # heap of (total cost, worker)
+    deques: list[list[int]] = [[] for _ in range(workers)]
+    for n in by_cost:
+        load, i = heapq.heappop(loads)
+        deques[i].append(n)
+        heapq.heappush(loads, (load + estimate_cost(n, engine), i))
+    return deques
+
+class Deques:
+    """per-worker deques of numbers in shared memory"""
+
+    def __init__(self, deques: list[list[int]]):
+        self.jobs = RawArray('Q', sum(len(d) for d in deques))
+        self.bounds = RawArray('q', 2 * len(deques))  # head, tail of each deque
+        self.locks = [Lock() for _ in deques]
+        pos = 0
+        for i, numbers in enumerate(deques):
+            self.jobs[pos:pos + len(numbers)] = numbers
+            self.bounds[2 * i] = pos
+            pos += len(numbers)
+            self.bounds[2 * i + 1] = pos
+
+    def pop_front(self, i: int) -> int | None:
+        with self.locks[i]:
+            head, tail = self.bounds[2 * i], self.bounds[2 * i + 1]
+            if head < tail:
+                self.bounds[2 * i] = head + 1
+                return self.jobs[head]
+        return None
+
+    def pop_back(self, i: int) -> int | None:
+        with self.locks[i]:
+            head, tail = self.bounds[2 * i], self.bounds[2 * i + 1]
+            if head < tail:
+                self.bounds[2 * i + 1] = tail - 1
+                return self.jobs[tail - 1]
+        return None
+
+    def steal(self, thief: int) -> int | None:
+        """take a job from the back of another deque, if any is left"""
+        count = len(self.locks)
+        for offset in range(1, count):
+            if (n := self.pop_back((thief + offset) % count)) is not None:
+                return n
+        return None
+
+def worker(me: int, deques: Deques, results: ResultQueue) -> None:
+    t0 = perf_counter()
+    jobs = stolen = 0
+    busy = 0.0
+    while True:
+        from_own = (n := deques.pop_front(me)) is not None
+        if not from_own and (n := deques.steal(me)) is None:
+            break  # no jobs left anywhere: jobs are never added
+        t1 = perf_counter()
+        prime = is_prime(n)
+        elapsed = perf_counter() - t1
+        busy += elapsed
+        jobs += 1
+        stolen += not from_own
+        results.put(PrimeResult(n, prime, elapsed, me, not from_own))
+    results.put(WorkerStats(me, jobs, stolen, busy, perf_counter() - t0))
+
+def report(workers: int, results: ResultQueue, wall_start: float) -> int:
+    checked = 0
+    stats: list[Any] = []
+    while len(stats) < workers:
+        match results.get():
+            case PrimeResult(n, prime, elapsed, who, stolen):
+                checked += 1
+                label = 'P' if prime else ' '
+                mark = '*' if stolen else ' '
+                print(f'{n:16}  {label} {elapsed:9.6f}s  worker {who}{mark}')
+            case WorkerStats() as worker_stats:
+                stats.append(worker_stats)
+    wall = perf_counter() - wall_start
+    print('\nworker  jobs  stolen     busy  utilization')
+    for s in sorted(stats):
+        print(f'{s.worker:6} {s.jobs:5} {s.stolen:7} {s.busy:7.2f}s {s.busy / wall:11.0%}')
+    total_busy = sum(s.busy for s in stats)
+    print(f'{"all":>6} {checked:5} {sum(s.stolen for s in stats):7}'
+          f' {total_busy:7.2f}s {total_busy / (wall * workers):11.0%}')
+    return checked
+
+def main() -> None:
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else cpu_count()
+    engine = engine_name()
+    print(f'Checking {len(NUMBERS)} numbers with {workers} processes'
+          f' and work stealing ({engine}):')
+    t0 = perf_counter()
+    deques = Deques(pack(NUMBERS, workers, engine))
+    results: ResultQueue = SimpleQueue()
+    procs = [Process(target=worker, args=(i, deques, results))
+             for i in range(workers)]
+    for proc in procs:
+        proc.start()
+    checked = report(workers, results, t0)
+    for proc in procs:
+        proc.join()
+    print(f'{checked} checks in {perf_counter() - t0:.2f}s;'
+          ' * marks stolen jobs')
+
+if __name__ == '__main__':
+    main()
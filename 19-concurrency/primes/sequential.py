@@ -8,7 +8,9 @@ and threading code for CPU-intensive work.
 from time import perf_counter
 from typing import NamedTuple
 
-from primes import is_prime, NUMBERS
+from primes import NUMBERS, engine_name, get_engine
+
+is_prime = get_engine()  # set PRIMES_ENGINE to choose
 
 class Result(NamedTuple):  # <1>
     prime: bool
@@ -20,7 +22,7 @@ def check(n: int) -> Result:  # <2>
     return Result(prime, perf_counter() - t0)
 
 def main() -> None:
-    print(f'Checking {len(NUMBERS)} numbers sequentially:')
+    print(f'Checking {len(NUMBERS)} numbers sequentially ({engine_name()}):')
     t0 = perf_counter()
     for n in NUMBERS:  # <3>
         prime, elapsed = check(n)
@@ -12,7 +12,9 @@ from time import perf_counter
 from typing import NamedTuple
 from threading import Thread
 
-from primes import is_prime, NUMBERS
+from primes import NUMBERS, engine_name, get_engine
+
+is_prime = get_engine()  # set PRIMES_ENGINE to choose
 
 class PrimeResult(NamedTuple):
     n: int
@@ -59,7 +61,7 @@ def main() -> None:
     else:
         workers = int(sys.argv[1])
 
-    print(f'Checking {len(NUMBERS)} numbers with {workers} threads:')
+    print(f'Checking {len(NUMBERS)} numbers with {workers} threads ({engine_name()}):')
     t0 = perf_counter()
     jobs: JobQueue = SimpleQueue()
     results: ResultQueue = SimpleQueue()
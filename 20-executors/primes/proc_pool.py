@@ -11,7 +11,9 @@ from concurrent import futures  # <1>
 from time import perf_counter
 from typing import NamedTuple
 
-from primes import is_prime, NUMBERS
+from primes import NUMBERS, engine_name, get_engine
+
+is_prime = get_engine()  # set PRIMES_ENGINE to choose
 
 class PrimeResult(NamedTuple):  # <2>
     n: int
@@ -32,7 +34,8 @@ def main() -> None:
     executor = futures.ProcessPoolExecutor(workers)  # <4>
     actual_workers = executor._max_workers  # type: ignore  # <5>
 
-    print(f'Checking {len(NUMBERS)} numbers with {actual_workers} processes:')
+    print(f'Checking {len(NUMBERS)} numbers with {actual_workers} processes'
+          f' ({engine_name()}):')
 
     t0 = perf_counter()
 
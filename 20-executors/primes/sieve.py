@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+
+"""
+sieve.py: all primes in a range [a, b), with a segmented Sieve of
+Eratosthenes, parallelized with `concurrent.futures.ProcessPoolExecutor`.
+
+The range is split in segments of SEGMENT_SIZE numbers. Each segment is
+sieved in a `bytearray` with one byte per odd number, small enough to
+stay in the CPU cache, using the base primes up to sqrt(b), kept in an
+`array('I')` sent once to each worker process. Primes are yielded as
+segments complete, in order, with only a few segments in memory::
+
+    >>> list(primes_between(90, 110, workers=1))
+    [97, 101, 103, 107, 109]
+    >>> sum(1 for _ in primes_between(0, 1_000_000, workers=2))
+    78498
+
+Usage::
+
+    $ ./sieve.py 1_000_000_000_000 1_000_000_001_000
+    $ ./sieve.py 0 1_000_000_000 --count --workers 4
+"""
+
+import argparse
+import math
+import sys
+from array import array
+from collections import deque
+from collections.abc import Iterator
+from concurrent import futures
+from itertools import compress
+from time import perf_counter
+
+SEGMENT_SIZE = 1 << 18  # numbers per segment: a 128 KiB bytearray of odd numbers
+TASKS_PER_WORKER = 2  # segments in flight for each worker
+
+def base_primes(limit: int) -> array:
+    """primes <= limit, with a simple sieve"""
+    if limit < 2:
+        return array('I')
+    flags = bytearray([1]) * (limit + 1)
+    flags[:2] = b'\x00\x00'
+    for p in range(2, math.isqrt(limit) + 1):
+        if flags[p]:
+            flags[p * p::p] = bytes(len(range(p * p, limit + 1, p)))
+    return array('I', compress(range(limit + 1), flags))
+
+def sieve_segment(lo: int, hi: int, base: array) -> array:
+    """primes in [lo, hi), using `base` primes up to sqrt(hi)"""
+    found = array('Q', [2] if lo <= 2 < hi else [])
+    first = max(lo, 3) | 1  # first odd number >= max(lo, 3)
+    if first >= hi:
+        return found
+    size = (hi - first + 1) // 2  # odd numbers in [first, hi)
+    flags = bytearray([1]) * size  # flags[i] is for first + 2 * i
+    for p in base:
+        if p == 2:
+            continue
+        square = p * p
+        if square >= hi:
+            break
+        start = max(square, -(-first // p) * p)  # first multiple >= first
+        if start % 2 == 0:
+            start += p  # odd multiples only
+        i = (start - first) // 2
+        if i < size:
+            flags[i::p] = bytes(len(range(i, size, p)))
+    found.extend(compress(range(first, hi, 2), flags))
+    return found
+
+_base: array  # base primes, set in each worker process by init_worker
+
+def init_worker(base: array) -> None:
+    global _base
+    _base = base
+
+def sieve_task(lo: int, hi: int) -> array:
+    return sieve_segment(lo, hi, _base)
+
+def primes_between(a: int, b: int, workers: int | None = None,
+                   segment_size: int = SEGMENT_SIZE) -> Iterator[int]:
+    """yield primes in [a, b) in order; `workers` defaults to CPU count"""
+    base = base_primes(math.isqrt(max(b - 1, 0)))
+    bounds = ((lo, min(lo + segment_size, b)) for lo in range(a, b, segment_size))
+    if workers == 1:
+        for lo, hi in bounds:
+            yield from sieve_segment(lo, hi, base)
+        return
+    with futures.ProcessPoolExecutor(workers, initializer=init_worker,
+                                     initargs=(base,)) as executor:
+        window = executor._max_workers * TASKS_PER_WORKER  # type: ignore
+        pending: deque[futures.Future] = deque()
+        for lo, hi in bounds:
+            pending.append(executor.submit(sieve_task, lo, hi))
+            if len(pending) >= window:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+def main(argv: list[str]) -> None:
+    parser = argparse.ArgumentParser(description='Print primes in [A, B).')
+    parser.add_argument('a', type=int)
+    parser.add_argument('b', type=int)
+    parser.add_argument('-w', '--workers', type=int,
+                        help='worker processes (default: CPU count)')
+    parser.add_argument('--count', action='store_true',
+                        help='print only how many primes were found')
+    args = parser.parse_args(argv)
+
+    t0 = perf_counter()
+    primes = primes_between(args.a, args.b, args.workers)
+    if args.count:
+        print(sum(1 for _ in primes))
+    else:
+        for p in primes:
+            print(p)
+    print(f'Total time: {perf_counter() - t0:.2f}s', file=sys.stderr)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,251 @@
+"""
+Compressed bitmaps for dense posting lists, in the style of Roaring bitmaps.
+
+A ``Bitmap`` splits code points into blocks of 64K, by their high bits.
+The low 16 bits of the code points in each block are stored in the
+smallest of three containers:
+
+* ``ArrayContainer``: sorted ``array('H')``, 2 bytes per entry;
+* ``RunContainer``: runs of consecutive values, 4 bytes per run;
+* ``BitsContainer``: a 65536-bit ``int``, 8 KiB for any number of entries.
+
+AND and OR between bitsets and runs use ``int`` operators, which run
+in C over the whole block; arrays are probed one value at a time,
+because they are short. Containers are immutable, so the ``int``
+form of each run or array container is computed only once.
+
+    >>> letters = Bitmap.from_sorted([65, 66, 67, 97, 98, 99, 0x1D400, 0x1D401])
+    >>> len(letters), 98 in letters, 100 in letters
+    (8, True, False)
+    >>> cjk = Bitmap.from_sorted(range(0x4E00, 0xA000))
+    >>> cjk.containers
+    {0: RunContainer(1 runs)}
+    >>> list(letters & Bitmap.from_sorted(range(66, 100)))
+    [66, 67, 97, 98, 99]
+    >>> len(cjk | letters), len(cjk & letters)
+    (21000, 0)
+    >>> evens = Bitmap.from_sorted(range(0, 0x20000, 2))
+    >>> evens.containers
+    {0: BitsContainer(32768 values), 1: BitsContainer(32768 values)}
+    >>> list(evens & letters)
+    [66, 98, 119808]
+    >>> (cjk & Bitmap.from_sorted(range(0x4E10, 0x20000))).to_list()[:3]
+    [19984, 19985, 19986]
+
+"""
+
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import Iterable, Iterator
+from functools import cached_property
+
+BLOCK_BITS = 16
+LOW_MASK = (1 << BLOCK_BITS) - 1
+ARRAY_MAX = 4096  # above this size, a bitset is smaller than an array
+BITS_BYTES = (1 << BLOCK_BITS) // 8
+
+
+def iter_bits(bits: int) -> Iterator[int]:
+    """yield positions of bits set in 65536-bit `bits`, in ascending order"""
+    words = array('Q', bits.to_bytes(BITS_BYTES, sys.byteorder))
+    for i, word in enumerate(words):
+        base = i * 64
+        while word:
+            lowest = word & -word
+            yield base + lowest.bit_length() - 1
+            word ^= lowest
+
+
+class ArrayContainer:
+    def __init__(self, values: Iterable[int]):
+        self.values = array('H', values)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.values)
+
+    def __contains__(self, value: int) -> bool:
+        i = bisect_left(self.values, value)
+        return i < len(self.values) and self.values[i] == value
+
+    @cached_property
+    def bits(self) -> int:
+        bits = 0
+        for value in self.values:
+            bits |= 1 << value
+        return bits
+
+    def to_bits(self) -> int:
+        return self.bits
+
+    def __repr__(self) -> str:
+        return f'ArrayContainer({len(self)} values)'
+
+
+class RunContainer:
+    def __init__(self, runs: Iterable[tuple[int, int]]):
+        """`runs` are (first, last) pairs, inclusive"""
+        self.firsts = array('H')
+        self.lasts = array('H')
+        for first, last in runs:
+            self.firsts.append(first)
+            self.lasts.append(last)
+        self.size = sum(self.lasts) - sum(self.firsts) + len(self.firsts)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __iter__(self) -> Iterator[int]:
+        for first, last in zip(self.firsts, self.lasts):
+            yield from range(first, last + 1)
+
+    def extend(self, codes: list[int], base: int) -> None:
+        for first, last in zip(self.firsts, self.lasts):
+            codes.extend(range(base + first, base + last + 1))
+
+    def __contains__(self, value: int) -> bool:
+        i = bisect_right(self.firsts, value) - 1
+        return i >= 0 and value <= self.lasts[i]
+
+    @cached_property
+    def bits(self) -> int:
+        bits = 0
+        for first, last in zip(self.firsts, self.lasts):
+            bits |= ((1 << (last - first + 1)) - 1) << first
+        return bits
+
+    def to_bits(self) -> int:
+        return self.bits  # containers are immutable, so this is computed once
+
+    def __repr__(self) -> str:
+        return f'RunContainer({len(self.firsts)} runs)'
+
+
+class BitsContainer:
+    def __init__(self, bits: int):
+        self.bits = bits
+        self.size = bits.bit_count()
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __iter__(self) -> Iterator[int]:
+        return iter_bits(self.bits)
+
+    def extend(self, codes: list[int], base: int) -> None:
+        starts = self.bits & ~(self.bits << 1)  # first bit of each run
+        if 4 * starts.bit_count() > self.size:  # short runs: yield bit by bit
+            codes.extend(base | low for low in iter_bits(self.bits))
+            return
+        lasts = self.bits & ~(self.bits >> 1)  # last bit of each run
+        for first, last in zip(iter_bits(starts), iter_bits(lasts)):
+            codes.extend(range(base + first, base + last + 1))
+
+    def __contains__(self, value: int) -> bool:
+        return bool(self.table[value >> 3] >> (value & 7) & 1)
+
+    @cached_property
+    def table(self) -> bytes:
+        """`bits` as bytes, bit 0 first, so a test reads one byte"""
+        return self.bits.to_bytes(BITS_BYTES, 'little')
+
+    def to_bits(self) -> int:
+        return self.bits
+
+    def __repr__(self) -> str:
+        return f'BitsContainer({len(self)} values)'
+
+
+Container = ArrayContainer | RunContainer | BitsContainer
+
+
+def make_container(values: list[int]) -> Container:
+    """return the smallest container for sorted 16-bit `values`"""
+    runs = []
+    for value in values:
+        if runs and runs[-1][1] == value - 1:
+            runs[-1][1] = value
+        else:
+            runs.append([value, value])
+    if 4 * len(runs) < min(2 * len(values), BITS_BYTES):
+        return RunContainer(runs)
+    if len(values) <= ARRAY_MAX:
+        return ArrayContainer(values)
+    bits = 0
+    for first, last in runs:
+        bits |= ((1 << (last - first + 1)) - 1) << first
+    return BitsContainer(bits)
+
+
+# Results of AND and OR are not compressed again: they are usually
+# short-lived, and converting them would cost more than the operation.
+
+def and_containers(a: Container, b: Container) -> Container:
+    if isinstance(b, ArrayContainer) and not isinstance(a, ArrayContainer):
+        a, b = b, a
+    if isinstance(a, ArrayContainer):
+        return ArrayContainer(value for value in a if value in b)
+    return BitsContainer(a.to_bits() & b.to_bits())
+
+
+def or_containers(a: Container, b: Container) -> Container:
+    if isinstance(a, ArrayContainer) and isinstance(b, ArrayContainer):
+        return make_container(sorted(set(a.values).union(b.values)))
+    return BitsContainer(a.to_bits() | b.to_bits())
+
+
+class Bitmap:
+    def __init__(self, containers: dict[int, Container]):
+        self.containers = containers
+
+    @classmethod
+    def from_sorted(cls, codes: Iterable[int]) -> 'Bitmap':
+        blocks: dict[int, list[int]] = {}
+        for code in codes:
+            blocks.setdefault(code >> BLOCK_BITS, []).append(code & LOW_MASK)
+        return cls({high: make_container(low) for high, low in blocks.items()})
+
+    def __len__(self) -> int:
+        return sum(len(container) for container in self.containers.values())
+
+    def __iter__(self) -> Iterator[int]:
+        for high in sorted(self.containers):
+            base = high << BLOCK_BITS
+            for low in self.containers[high]:
+                yield base | low
+
+    def to_list(self) -> list[int]:
+        """return sorted list of code points, faster than iterating"""
+        codes: list[int] = []
+        for high in sorted(self.containers):
+            base = high << BLOCK_BITS
+            container = self.containers[high]
+            if isinstance(container, (RunContainer, BitsContainer)):
+                container.extend(codes, base)
+            else:
+                codes.extend(base | low for low in container)
+        return codes
+
+    def __contains__(self, code: int) -> bool:
+        container = self.containers.get(code >> BLOCK_BITS)
+        return container is not None and (code & LOW_MASK) in container
+
+    def __and__(self, other: 'Bitmap') -> 'Bitmap':
+        containers = {}
+        for high in self.containers.keys() & other.containers.keys():
+            container = and_containers(self.containers[high], other.containers[high])
+            if len(container):
+                containers[high] = container
+        return Bitmap(containers)
+
+    def __or__(self, other: 'Bitmap') -> 'Bitmap':
+        containers = dict(self.containers)
+        for high, container in other.containers.items():
+            if high in containers:
+                containers[high] = or_containers(containers[high], container)
+            else:
+                containers[high] = container
+        return Bitmap(containers)
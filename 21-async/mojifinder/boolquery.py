@@ -0,0 +1,294 @@
+"""
+Boolean queries over a ``postings.PostingIndex``.
+
+Query syntax:
+
+* ``cat face``: characters with all the words (AND);
+* ``arrow | triangle``: characters with any of the alternatives (OR);
+* ``cat -face``: excludes characters with the word after ``-`` (NOT);
+* ``"black star"``: the words must be adjacent, in that order, in the
+  name of a character or, with a ``MappedIndex``, in an alias or keyword;
+* parentheses group subexpressions: ``(black | white) -(chess | star)``.
+
+``parse`` builds a syntax tree; ``make_plan`` turns it into a tree of
+posting operations, with the operands of each intersection ordered by
+the size of their posting lists, so the smallest set is fetched first.
+Printing a plan shows the estimated size of each step::
+
+    >>> from postings import CompactIndex
+    >>> idx = CompactIndex(32, 0x2700)
+    >>> print(make_plan(parse('star -white | "black star"'), idx))
+    ((STAR[9] - WHITE[88]) | (STAR[9] & BLACK[93] & "BLACK STAR"))
+
+``search_codes`` returns the sorted code points matching the query::
+
+    >>> [chr(code) for code in search_codes(idx, 'chess king')]
+    ['♔', '♚']
+    >>> [chr(code) for code in search_codes(idx, 'chess king -white')]
+    ['♚']
+    >>> [chr(code) for code in search_codes(idx, 'chess (king | queen) -black')]
+    ['♔', '♕']
+    >>> [chr(code) for code in search_codes(idx, '"black star"')]
+    ['★']
+    >>> [chr(code) for code in search_codes(idx, '"star black"')]
+    []
+
+Malformed queries raise ``QueryError``::
+
+    >>> search_codes(idx, '-cat')
+    Traceback (most recent call last):
+      ...
+    boolquery.QueryError: query has no positive terms
+    >>> search_codes(idx, 'cat | (dog')
+    Traceback (most recent call last):
+      ...
+    boolquery.QueryError: expected ')' at end of query
+    >>> search_codes(idx, '(' * 1000 + 'cat')
+    Traceback (most recent call last):
+      ...
+    boolquery.QueryError: query nested more than 32 levels deep
+
+"""
+
+import re
+from collections.abc import Iterator
+
+from charindex import tokenize
+from postings import PostingIndex, Postings, difference, intersect, union
+
+TOKEN_RE = re.compile(r'''
+    (?P<phrase>"[^"]*")      # words within double quotes
+  | (?P<op>[()|])            # grouping and OR
+  | (?P<neg>-)(?=[^\s-])     # NOT, when it prefixes an operand
+  | (?P<word>[^\s"()|]+)     # anything else, except whitespace
+  | (?P<error>\S)            # unmatched double quote
+''', re.VERBOSE)
+
+
+MAX_DEPTH = 32  # nested parentheses and negations, to bound recursion
+
+
+class QueryError(ValueError):
+    """malformed boolean query"""
+
+
+# Syntax tree ------------------------------------------------------------
+
+class Term:
+    def __init__(self, words: list[str]):
+        self.words = words  # more than one word means a phrase
+
+
+class Not:
+    def __init__(self, operand):
+        self.operand = operand
+
+
+class And:
+    def __init__(self, operands: list):
+        self.operands = operands
+
+
+class Or:
+    def __init__(self, operands: list):
+        self.operands = operands
+
+
+def lex(text: str) -> Iterator[tuple[str, str]]:
+    for match in TOKEN_RE.finditer(text):
+        kind = match.lastgroup
+        value = match.group()
+        if kind == 'error':
+            raise QueryError(f'unmatched {value!r} in query')
+        if kind == 'phrase':
+            value = value[1:-1]
+        yield kind, value
+
+
+class Parser:
+    """recursive descent parser:
+
+    or_expr  := and_expr ('|' and_expr)*
+    and_expr := unary+
+    unary    := '-' unary | atom
+    atom     := word | phrase | '(' or_expr ')'
+    """
+
+    def __init__(self, text: str):
+        self.tokens = list(lex(text))
+        self.pos = 0
+        self.depth = 0
+
+    def peek(self) -> tuple[str, str]:
+        if self.pos < len(self.tokens):
+            return self.tokens[self.pos]
+        return ('end', '')
+
+    def parse(self):
+        if not self.tokens:
+            raise QueryError('empty query')
+        tree = self.or_expr()
+        if self.peek()[0] != 'end':
+            raise QueryError(f'unexpected {self.peek()[1]!r} in query')
+        return tree
+
+    def or_expr(self):
+        operands = [self.and_expr()]
+        while self.peek() == ('op', '|'):
+            self.pos += 1
+            operands.append(self.and_expr())
+        return operands[0] if len(operands) == 1 else Or(operands)
+
+    def and_expr(self):
+        operands = []
+        while self.peek()[0] in ('word', 'phrase', 'neg') or self.peek() == ('op', '('):
+            if (operand := self.unary()) is not None:
+                operands.append(operand)
+        if not operands:
+            raise QueryError(f'expected search term before {self.peek()[1] or "end"!r}')
+        return operands[0] if len(operands) == 1 else And(operands)
+
+    def unary(self):
+        kind, value = self.peek()
+        if kind == 'neg' or (kind, value) == ('op', '('):
+            self.depth += 1
+            if self.depth > MAX_DEPTH:
+                raise QueryError(f'query nested more than {MAX_DEPTH} levels deep')
+        if kind == 'neg':
+            self.pos += 1
+            operand = self.unary()
+            self.depth -= 1
+            return None if operand is None else Not(operand)
+        self.pos += 1
+        if (kind, value) == ('op', '('):
+            tree = self.or_expr()
+            if self.peek() != ('op', ')'):
+                raise QueryError("expected ')' at end of query")
+            self.pos += 1
+            self.depth -= 1
+            return tree
+        words = list(tokenize(value))  # 'heart-shaped' is a 2-word phrase
+        return Term(words) if words else None
+
+
+def parse(text: str):
+    return Parser(text).parse()
+
+
+# Query plan -------------------------------------------------------------
+
+class Fetch:
+    """posting list of one word"""
+
+    def __init__(self, index: PostingIndex, word: str):
+        self.index = index
+        self.word = word
+        self.postings = index.postings(word)
+        self.size = len(self.postings)
+
+    def execute(self) -> Postings:
+        return self.postings
+
+    def __str__(self) -> str:
+        return f'{self.word}[{self.size}]'
+
+
+class Intersect:
+    """characters in all `include` steps and no `exclude` step,
+    with the words of each phrase adjacent in a name, alias or keyword"""
+
+    def __init__(self, index: PostingIndex, include: list, exclude: list,
+                 phrases: list[list[str]]):
+        if not include:
+            raise QueryError('query has no positive terms')
+        self.index = index
+        self.include = sorted(include, key=lambda step: step.size)
+        self.exclude = exclude
+        self.phrases = phrases
+        self.size = self.include[0].size
+
+    def execute(self) -> Postings:
+        fetches = [step for step in self.include if isinstance(step, Fetch)]
+        if len(fetches) > 1:  # the index may use bitmaps for frequent words
+            found = self.index.intersect_words([step.word for step in fetches])
+            others = [step for step in self.include if not isinstance(step, Fetch)]
+        else:
+            found, others = self.include[0].execute(), self.include[1:]
+        for step in others:
+            if not found:
+                return []
+            found = intersect([found, step.execute()])
+        for step in self.exclude:
+            found = difference(found, step.execute())
+        for words in self.phrases:
+            found = [code for code in found if has_phrase(self.index, code, words)]
+        return found
+
+    def __str__(self) -> str:
+        parts = [' & '.join(str(step) for step in self.include)]
+        parts.extend(f' - {step}' for step in self.exclude)
+        parts.extend(f' & "{" ".join(words)}"' for words in self.phrases)
+        return f'({"".join(parts)})'
+
+
+class Union:
+    def __init__(self, steps: list):
+        self.steps = steps
+        self.size = sum(step.size for step in steps)
+
+    def execute(self) -> Postings:
+        return union([step.execute() for step in self.steps])
+
+    def __str__(self) -> str:
+        return f'({" | ".join(str(step) for step in self.steps)})'
+
+
+def has_phrase(index: PostingIndex, code: int, words: list[str]) -> bool:
+    """check if `words` are adjacent in the name, an alias or a keyword"""
+    size = len(words)
+    for text in index.texts(code):
+        tokens = list(tokenize(text))
+        if any(tokens[i:i + size] == words for i in range(len(tokens) - size + 1)):
+            return True
+    return False
+
+
+def make_plan(tree, index: PostingIndex):
+    match tree:
+        case Term(words=[word]):
+            return Fetch(index, word)
+        case Or(operands=operands):
+            return Union([make_plan(operand, index) for operand in operands])
+        case Not():
+            return Intersect(index, [], [make_plan(tree.operand, index)], [])
+        case _:
+            return make_intersect(tree, index)
+
+
+def make_intersect(tree, index: PostingIndex) -> Intersect:
+    include: list = []
+    exclude: list = []
+    phrases: list[list[str]] = []
+    operands = tree.operands if isinstance(tree, And) else [tree]
+    for operand in operands:
+        if isinstance(operand, Not):
+            exclude.append(make_plan(operand.operand, index))
+        elif isinstance(operand, Term) and len(operand.words) > 1:  # a phrase
+            include.extend(Fetch(index, word) for word in operand.words)
+            phrases.append(operand.words)
+        else:
+            step = make_plan(operand, index)
+            if isinstance(step, Intersect):  # flatten nested AND
+                include.extend(step.include)
+                exclude.extend(step.exclude)
+                phrases.extend(step.phrases)
+            else:
+                include.append(step)
+    return Intersect(index, include, exclude, phrases)
+
+
+def search_codes(index: PostingIndex, text: str) -> list[int]:
+    """return sorted code points matching boolean query `text`"""
+    if not text.strip():
+        return []
+    return list(make_plan(parse(text), index).execute())
@@ -66,11 +66,15 @@ class InvertedIndex:
             return set()
 
 
+def format_line(char: Char) -> str:
+    name = unicodedata.name(char)
+    code = ord(char)
+    return f'U+{code:04X}\t{char}\t{name}'
+
+
 def format_results(chars: set[Char]) -> Iterator[str]:
     for char in sorted(chars):
-        name = unicodedata.name(char)
-        code = ord(char)
-        yield f'U+{code:04X}\t{char}\t{name}'
+        yield format_line(char)
 
 
 def main(words: list[str]) -> None:
@@ -0,0 +1,96 @@
+"""
+Typo-tolerant word lookup for the Mojifinder index.
+
+``TrigramIndex`` maps each 3-letter substring of the vocabulary words,
+padded with ``$`` at both ends, to the positions of the words
+containing it. A misspelled word shares most of its trigrams with the
+intended word, so candidates are the words with enough trigrams in
+common; only those are checked with a bounded edit distance::
+
+    >>> trigrams('CAT')
+    ['$CA', 'CAT', 'AT$']
+    >>> tri = TrigramIndex(['RAIN', 'RAINBOW', 'RAINBOWS', 'RAVEN', 'ROBOT'])
+    >>> tri.similar('RAINBW')
+    ['RAINBOW']
+    >>> tri.similar('RAINBOWZ')
+    ['RAINBOW', 'RAINBOWS']
+    >>> tri.similar('XYZ')
+    []
+
+``edit_distance`` gives up as soon as the distance exceeds `bound`::
+
+    >>> edit_distance('KITTEN', 'SITTING', 3)
+    3
+    >>> edit_distance('KITTEN', 'SITTING', 2)
+    3
+
+"""
+
+from array import array
+from collections import Counter, defaultdict
+from collections.abc import Sequence
+
+# Words this short have too few trigrams to find misspellings reliably.
+MIN_FUZZY_LEN = 3
+
+
+def trigrams(word: str) -> list[str]:
+    padded = f'${word}$'
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+def max_distance(word: str) -> int:
+    """edits tolerated in a misspelling of `word`"""
+    return 1 if len(word) < 7 else 2
+
+
+def edit_distance(a: str, b: str, bound: int) -> int:
+    """Levenshtein distance between `a` and `b`, or `bound + 1` if greater"""
+    if abs(len(a) - len(b)) > bound:
+        return bound + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1,  # deletion
+                               current[j - 1] + 1,  # insertion
+                               previous[j - 1] + (char_a != char_b)))  # substitution
+        if min(current) > bound:
+            return bound + 1
+        previous = current
+    return min(previous[-1], bound + 1)
+
+
+class TrigramIndex:
+    def __init__(self, words: Sequence[str]):
+        self.words = words
+        positions: defaultdict[str, list[int]] = defaultdict(list)
+        for i, word in enumerate(words):
+            for gram in set(trigrams(word)):
+                positions[gram].append(i)
+        self.positions = {gram: array('I', pos) for gram, pos in positions.items()}
+
+    def similar(self, word: str) -> list[str]:
+        """return the words closest to `word` within `max_distance` edits"""
+        if len(word) < MIN_FUZZY_LEN:
+            return []
+        bound = max_distance(word)
+        grams = set(trigrams(word))
+        # each edit changes at most 3 trigrams of a word
+        min_shared = max(1, len(grams) - 3 * bound)
+        shared: Counter[int] = Counter()
+        for gram in grams:
+            shared.update(self.positions.get(gram, ()))
+        best = bound + 1
+        found: list[str] = []
+        for i, count in shared.items():
+            if count < min_shared:
+                continue
+            candidate = self.words[i]
+            distance = edit_distance(word, candidate, min(best, bound))
+            if distance < best:
+                best = distance
+                found = [candidate]
+            elif distance == best <= bound:
+                found.append(candidate)
+        return sorted(found)
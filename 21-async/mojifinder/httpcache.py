@@ -0,0 +1,95 @@
+"""
+Helpers for HTTP caching and precompressed responses.
+
+``make_etag`` derives a strong entity tag from the parts that determine
+a response, such as the index version and the normalized query::
+
+    >>> tag = make_etag('MOJIDX02/15.0.0/20-110000', 'CAT FACE')
+    >>> tag
+    '"b7ed143fd7c685ecf813d237"'
+    >>> etag_matches(tag, tag), etag_matches(f'W/{tag}, "abc"', tag)
+    (True, True)
+    >>> etag_matches('"abc"', tag), etag_matches(None, tag), etag_matches('*', tag)
+    (False, False, True)
+
+``choose_encoding`` picks the best of the `available` content codings
+accepted by the client, in order of preference::
+
+    >>> choose_encoding('gzip, deflate, br', ['br', 'gzip'])
+    'br'
+    >>> choose_encoding('gzip;q=0.5, br;q=0', ['br', 'gzip'])
+    'gzip'
+    >>> choose_encoding(None, ['br', 'gzip']) is None
+    True
+
+``precompress`` returns a body in every coding supported here,
+including ``br`` only if the optional ``brotli`` package is installed::
+
+    >>> variants = precompress(b'<p>Hello</p>' * 100)
+    >>> variants['identity'] == b'<p>Hello</p>' * 100
+    True
+    >>> gzip.decompress(variants['gzip']) == variants['identity']
+    True
+
+"""
+
+import gzip
+from collections.abc import Iterable
+from hashlib import blake2b
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+ETAG_BYTES = 12
+
+
+def make_etag(*parts: str) -> str:
+    digest = blake2b('\0'.join(parts).encode(), digest_size=ETAG_BYTES)
+    return f'"{digest.hexdigest()}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """weak comparison, as required for If-None-Match"""
+    if not if_none_match:
+        return False
+    tags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+    return '*' in tags or etag in tags
+
+
+def choose_encoding(accept_encoding: str | None,
+                    available: Iterable[str]) -> str | None:
+    if not accept_encoding:
+        return None
+    accepted = set()
+    for item in accept_encoding.lower().split(','):
+        coding, *params = [part.strip() for part in item.split(';')]
+        if quality(params) > 0:
+            accepted.add(coding)
+    for coding in available:
+        if coding in accepted or '*' in accepted:
+            return coding
+    return None
+
+
+def quality(params: list[str]) -> float:
+    """value of the q parameter in `params`; 1 if missing or invalid"""
+    for param in params:
+        name, _, value = param.partition('=')
+        if name.strip() == 'q':
+            try:
+                return float(value)
+            except ValueError:
+                break
+    return 1.0
+
+
+def precompress(body: bytes) -> dict[str, bytes]:
+    """return `body` compressed with each supported coding, best first"""
+    variants = {}
+    if brotli is not None:
+        variants['br'] = brotli.compress(body)
+    variants['gzip'] = gzip.compress(body, compresslevel=9, mtime=0)
+    variants['identity'] = body
+    return variants
@@ -0,0 +1,272 @@
+#!/usr/bin/env python
+
+"""
+Persistent version of ``charindex.InvertedIndex``.
+
+Building an ``InvertedIndex`` calls ``unicodedata.name`` for every code
+point, which takes a noticeable time on every server start. The
+``save`` function writes the index to a file once, including the aliases
+and keywords of a ``sources.SourceIndex``, and ``MappedIndex``
+memory-maps that file, so loading it is near-instant and all processes
+that map the same file share its pages through the OS page cache.
+
+File layout (all integers in native byte order)::
+
+    header      HEADER struct: magic, byte order, unidata_version,
+                start, stop, word count, size of the words block,
+                size of the postings block, count of characters with
+                extra texts, size of the extra texts block, digest of
+                the sources
+    words       sorted, uppercased words separated by '\\n', UTF-8,
+                padded with NUL to a multiple of 4 bytes
+    offsets     word count + 1 unsigned ints: posting list bounds
+    postings    unsigned ints: sorted code points of each word
+    extra codes sorted code points of characters with extra texts
+    extra offsets
+                extra codes + 1 unsigned ints: extra text bounds
+    line bounds stop - start + 1 unsigned ints: offsets of the result
+                line of each code point; empty for unnamed characters
+    lines       UTF-8 result lines 'U+XXXX<TAB>c<TAB>NAME<CR><LF>',
+                in code point order
+    extra texts UTF-8 aliases and keywords, separated by '\\n'
+
+Index a small range and save it to a temporary file::
+
+    >>> import tempfile
+    >>> from charindex import InvertedIndex
+    >>> path = Path(tempfile.mkdtemp()) / 'ascii.idx'
+    >>> save(InvertedIndex(32, 128), path, 32, 128)
+    >>> idx = MappedIndex(path)
+    >>> idx.unidata_version == unicodedata.unidata_version
+    True
+    >>> idx.version == f'MOJIDX03/{unicodedata.unidata_version}/20-80/00000000'
+    True
+    >>> list(idx.postings('DOLLAR'))
+    [36]
+    >>> sorted(idx.search('sign'))
+    ['#', '$', '%', '+', '<', '=', '>']
+    >>> idx.search('capital a')
+    {'A'}
+    >>> idx.search('brillig')
+    set()
+
+``.lines()`` returns pre-encoded result lines, ready to send to a client.
+Lines of consecutive code points come in a single ``memoryview``::
+
+    >>> [bytes(line) for line in idx.lines([36, 65, 66])]
+    [b'U+0024\\t$\\tDOLLAR SIGN\\r\\n', b'U+0041\\tA\\tLATIN CAPITAL LETTER A\\r\\nU+0042\\tB\\tLATIN CAPITAL LETTER B\\r\\n']
+    >>> idx.close()
+
+``load`` maps an existing file, rebuilding it when it is missing or
+was built with a different Unicode database or range::
+
+    >>> path.unlink()
+    >>> idx = load(path, 32, 128)
+    >>> path.exists()
+    True
+    >>> idx.search('small a')
+    {'a'}
+    >>> idx.close()
+
+"""
+
+import mmap
+import os
+import struct
+import sys
+import unicodedata
+from array import array
+from bisect import bisect_left
+from collections.abc import Iterable, Iterator, Sequence
+from pathlib import Path
+
+from charindex import STOP_CODE, InvertedIndex, format_line
+from postings import PostingIndex
+from sources import DEFAULT_SOURCES, DIGEST_SIZE, Source, SourceIndex, sources_digest
+
+MAGIC = b'MOJIDX03'
+HEADER = struct.Struct(f'<8sc16sIIIIIII{DIGEST_SIZE}s')
+INDEX_PATH = Path(__file__).parent.absolute() / 'mojifinder.idx'
+
+BYTE_ORDER = sys.byteorder[:1].encode()  # b'l' or b'b'
+
+
+def save(index: InvertedIndex, path: Path, start: int, stop: int) -> None:
+    """write `index`, built for code points from `start` to `stop`, to `path`,
+    atomically replacing any existing file; extra texts and digest are saved
+    if `index` is a ``SourceIndex``"""
+    words = sorted(w for w, chars in index.entries.items() if chars)
+    words_block = '\n'.join(words).encode()
+    words_block += b'\x00' * (-len(words_block) % 4)
+    offsets = array('I', [0])
+    postings = array('I')
+    for word in words:
+        postings.extend(sorted(ord(c) for c in index.entries[word]))
+        offsets.append(len(postings))
+    extras = getattr(index, 'extras', {})
+    extra_codes = array('I', sorted(extras))
+    extra_offsets = array('I', [0])
+    extra_texts = bytearray()
+    for code in extra_codes:
+        extra_texts += '\n'.join(extras[code]).encode()
+        extra_offsets.append(len(extra_texts))
+    line_bounds = array('I', [0])
+    lines = bytearray()
+    for code in range(start, stop):
+        if unicodedata.name(chr(code), ''):
+            lines += format_line(chr(code)).encode() + b'\r\n'
+        line_bounds.append(len(lines))
+    header = HEADER.pack(MAGIC, BYTE_ORDER,
+                         unicodedata.unidata_version.encode(),
+                         start, stop, len(words), len(words_block), len(postings),
+                         len(extra_codes), len(extra_texts),
+                         getattr(index, 'digest', bytes(DIGEST_SIZE)))
+    tmp_path = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+    with open(tmp_path, 'wb') as fp:
+        fp.write(header)
+        fp.write(words_block)
+        offsets.tofile(fp)
+        postings.tofile(fp)
+        extra_codes.tofile(fp)
+        extra_offsets.tofile(fp)
+        line_bounds.tofile(fp)
+        fp.write(lines)
+        fp.write(extra_texts)
+    os.replace(tmp_path, path)  # readers never see a partial file
+
+
+class MappedIndex(PostingIndex):
+    """read-only inverted index backed by a memory-mapped file"""
+
+    def __init__(self, path: Path):
+        super().__init__()
+        with open(path, 'rb') as fp:
+            self._mmap = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        buf = memoryview(self._mmap)
+        if len(buf) < HEADER.size:
+            buf.release()
+            self._mmap.close()
+            raise ValueError(f'{path} is too short to be a mojifinder index')
+        (magic, byte_order, version, self.start, self.stop, count, words_len,
+         postings_len, extras_count, extras_len, self.digest) = HEADER.unpack_from(buf)
+        if magic != MAGIC or byte_order != BYTE_ORDER:
+            buf.release()
+            self._mmap.close()
+            raise ValueError(f'{path} is not a mojifinder index for this machine')
+        bounds_end = (HEADER.size + words_len + (count + 1) * 4 + postings_len * 4
+                      + (2 * extras_count + 1) * 4 + (self.stop - self.start + 1) * 4)
+        if len(buf) >= bounds_end:
+            (lines_len,) = struct.unpack_from('=I', buf, bounds_end - 4)
+        if len(buf) < bounds_end or len(buf) != bounds_end + lines_len + extras_len:
+            buf.release()
+            self._mmap.close()
+            raise ValueError(f'{path} is truncated or has trailing data')
+        self.unidata_version = version.rstrip(b'\x00').decode()
+        pos = HEADER.size
+        words_block = bytes(buf[pos:pos + words_len]).rstrip(b'\x00')
+        self.words = words_block.decode().split('\n') if count else []
+        pos += words_len
+        self._offsets = buf[pos:pos + (count + 1) * 4].cast('I')
+        pos += (count + 1) * 4
+        self._postings = buf[pos:pos + postings_len * 4].cast('I')
+        pos += postings_len * 4
+        self._extra_codes = buf[pos:pos + extras_count * 4].cast('I')
+        pos += extras_count * 4
+        self._extra_offsets = buf[pos:pos + (extras_count + 1) * 4].cast('I')
+        pos += (extras_count + 1) * 4
+        bounds_len = (self.stop - self.start + 1) * 4
+        self._line_bounds = buf[pos:pos + bounds_len].cast('I')
+        pos += bounds_len
+        self._lines = buf[pos:pos + lines_len]
+        pos += lines_len
+        self._extra_texts = buf[pos:pos + extras_len]
+
+    @property
+    def version(self) -> str:
+        """identifies the content of the index: format, Unicode version,
+        range and sources"""
+        return (f'{MAGIC.decode()}/{self.unidata_version}/'
+                f'{self.start:X}-{self.stop:X}/{self.digest[:4].hex()}')
+
+    def texts(self, code: int) -> list[str]:
+        texts = super().texts(code)
+        i = bisect_left(self._extra_codes, code)
+        if i < len(self._extra_codes) and self._extra_codes[i] == code:
+            extra = self._extra_texts[self._extra_offsets[i]:self._extra_offsets[i + 1]]
+            texts.extend(bytes(extra).decode().split('\n'))
+        return texts
+
+    def _postings_at(self, i: int) -> memoryview:
+        return self._postings[self._offsets[i]:self._offsets[i + 1]]
+
+    def lines(self, codes: Iterable[int], max_run: int = 256) -> Iterator[memoryview]:
+        """yield encoded result lines for sorted `codes`, joining the lines
+        of up to `max_run` consecutive code points in one slice"""
+        bounds = self._line_bounds
+        first = last = -1  # run of line positions: bounds[first]:bounds[last]
+        for code in codes:
+            i = code - self.start
+            if i == last and last - first < max_run:
+                last += 1
+                continue
+            if first >= 0:
+                yield self._lines[bounds[first]:bounds[last]]
+            first, last = i, i + 1
+        if first >= 0:
+            yield self._lines[bounds[first]:bounds[last]]
+
+    def close(self) -> None:
+        for view in (self._offsets, self._postings, self._extra_codes,
+                     self._extra_offsets, self._line_bounds, self._lines,
+                     self._extra_texts):
+            view.release()
+        self._mmap.close()
+
+
+def open_current(path: Path = INDEX_PATH,
+                 start: int = 32, stop: int = STOP_CODE,
+                 sources: Sequence[Source] = DEFAULT_SOURCES) -> MappedIndex | None:
+    """map index file at `path` if it exists and is up to date, else return None"""
+    try:
+        index = MappedIndex(path)
+    except (FileNotFoundError, ValueError):
+        return None
+    if (index.unidata_version == unicodedata.unidata_version
+            and (index.start, index.stop) == (start, stop)
+            and index.digest == sources_digest(sources)):
+        return index
+    index.close()
+    return None
+
+
+def build(path: Path = INDEX_PATH,
+          start: int = 32, stop: int = STOP_CODE,
+          sources: Sequence[Source] = DEFAULT_SOURCES) -> None:
+    """build index file at `path` unless it is up to date"""
+    if (index := open_current(path, start, stop, sources)) is not None:
+        index.close()
+    else:
+        save(SourceIndex(start, stop, sources), path, start, stop)
+
+
+def load(path: Path = INDEX_PATH,
+         start: int = 32, stop: int = STOP_CODE,
+         sources: Sequence[Source] = DEFAULT_SOURCES) -> MappedIndex:
+    """map index file at `path`, building it first if missing or stale"""
+    if (index := open_current(path, start, stop, sources)) is not None:
+        return index
+    save(SourceIndex(start, stop, sources), path, start, stop)
+    return MappedIndex(path)
+
+
+def main(args: list[str]) -> None:
+    path = Path(args[0]) if args else INDEX_PATH
+    print(f'Building {path}.')
+    save(SourceIndex(32, STOP_CODE), path, 32, STOP_CODE)
+    index = MappedIndex(path)
+    print(f'{len(index.words)} words, Unicode {index.unidata_version}.')
+    index.close()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,77 @@
+"""
+Background loading of the Mojifinder index.
+
+``IndexLoader.run`` maps the index file if it is up to date. Otherwise
+it builds the file in a worker process, so the servers can accept
+connections and answer health checks meanwhile. Optionally, a smaller
+index of the Basic Multilingual Plane is built first, and used to
+answer queries until the full index is ready. Each index is published
+with its trigram index for fuzzy queries already built, in a thread,
+so the first fuzzy query doesn't block the event loop.
+
+The ``state`` attribute is one of:
+
+* ``'loading'``: no index available yet; ``index`` is ``None``;
+* ``'partial'``: ``index`` covers only code points below `partial_stop`;
+* ``'ready'``: ``index`` covers the full range;
+* ``'failed'``: the build raised an exception, saved as ``error``.
+"""
+
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from charindex import STOP_CODE
+from indexfile import INDEX_PATH, MappedIndex, build, open_current
+
+START_CODE = 32
+BMP_STOP = 0x10000
+
+
+class IndexLoader:
+    index: MappedIndex | None
+
+    def __init__(self, path: Path = INDEX_PATH, partial_stop: int | None = BMP_STOP):
+        self.path = path
+        self.partial_stop = partial_stop
+        self.index = None
+        self.state = 'loading'
+        self.error: BaseException | None = None
+
+    @property
+    def ready(self) -> bool:
+        return self.state == 'ready'
+
+    def banner(self) -> str:
+        """describe the index state to clients"""
+        if self.state == 'partial':
+            return (f'Index loading: searching only U+{START_CODE:04X}'
+                    f' to U+{self.partial_stop - 1:04X} for now.')
+        if self.state == 'failed':
+            return f'Index build failed: {self.error!r}'
+        return 'Index loading, please try again soon.'
+
+    async def run(self) -> None:
+        if (index := open_current(self.path)) is not None:
+            await self._publish(index, 'ready')
+            return
+        loop = asyncio.get_running_loop()
+        context = multiprocessing.get_context('spawn')  # don't fork a running loop
+        try:
+            with ProcessPoolExecutor(1, mp_context=context) as pool:
+                if self.partial_stop:
+                    partial_path = self.path.with_suffix('.partial' + self.path.suffix)
+                    await loop.run_in_executor(
+                        pool, build, partial_path, START_CODE, self.partial_stop)
+                    await self._publish(MappedIndex(partial_path), 'partial')
+                await loop.run_in_executor(pool, build, self.path, START_CODE, STOP_CODE)
+        except Exception as exc:
+            self.state, self.error = 'failed', exc
+            raise
+        # the partial index is not closed: searches may still hold slices of it
+        await self._publish(MappedIndex(self.path), 'ready')
+
+    async def _publish(self, index: MappedIndex, state: str) -> None:
+        await asyncio.to_thread(lambda: index.trigrams)
+        self.index, self.state = index, state
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+
+"""
+Load generator for the Mojifinder servers.
+
+Replays a mix of queries over N concurrent connections against
+``tcp_mojifinder.py`` (``tcp`` protocol) or ``web_mojifinder.py`` and
+``web_mojifinder_bottle.py`` (``http`` protocol), then prints a JSON
+report with throughput and latency percentiles, for example::
+
+    $ ./loadgen.py tcp --port 2323 -c 50 -d 10
+    $ ./loadgen.py http --port 8000 -c 50 -n 5000 --queries queries.txt
+
+Each line of a queries file is one query. Latencies are measured from
+sending a query to reading the end of its response.
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import random
+import sys
+from collections import Counter
+from time import perf_counter
+from urllib.parse import quote
+
+PROMPT = b'?> '
+STREAM_LIMIT = 2**24  # responses to queries like 'letter' are large
+
+QUERY_MIX = [
+    'cat face', 'cat', 'heart', 'black star', 'arrow', 'smiling',
+    'chess', 'latin small letter a', 'greek', 'thumbs', 'moon',
+    'letter', 'sign', 'cjk ideograph', 'no such thing', 'face',
+]
+
+
+class Stats:
+    def __init__(self) -> None:
+        self.latencies: list[float] = []
+        self.errors: Counter[str] = Counter()
+        self.bytes = 0
+
+
+async def tcp_client(host: str, port: int, queries: 'Queries', stats: Stats) -> None:
+    reader, writer = await asyncio.open_connection(host, port, limit=STREAM_LIMIT)
+    try:
+        await reader.readuntil(PROMPT)
+        while (query := queries.next()) is not None:
+            t0 = perf_counter()
+            writer.write(query.encode() + b'\r\n')
+            data = await reader.readuntil(PROMPT)
+            stats.latencies.append(perf_counter() - t0)
+            stats.bytes += len(data)
+    finally:
+        writer.close()
+
+
+async def http_client(host: str, port: int, queries: 'Queries', stats: Stats,
+                      path: str) -> None:
+    reader = writer = None
+    try:
+        while (query := queries.next()) is not None:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(
+                    host, port, limit=STREAM_LIMIT)
+            t0 = perf_counter()
+            request = (f'GET {path}?q={quote(query)} HTTP/1.1\r\n'
+                       f'Host: {host}:{port}\r\n\r\n')
+            writer.write(request.encode())
+            status, size, keep_alive = await read_http_response(reader)
+            stats.latencies.append(perf_counter() - t0)
+            stats.bytes += size
+            if status != 200:
+                stats.errors[f'HTTP {status}'] += 1
+            if not keep_alive:
+                writer.close()
+                reader = writer = None
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+async def read_http_response(reader: asyncio.StreamReader) -> tuple[int, int, bool]:
+    """return status, body size and keep-alive flag of one response"""
+    head = await reader.readuntil(b'\r\n\r\n')
+    status_line, *header_lines = head.decode('latin-1').split('\r\n')
+    version, status, *_ = status_line.split()
+    headers = {}
+    for line in header_lines:
+        if line:
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip().lower()
+    keep_alive = headers.get('connection', '') != 'close' and version == 'HTTP/1.1'
+    if 'content-length' in headers:
+        size = int(headers['content-length'])
+        await reader.readexactly(size)
+    elif headers.get('transfer-encoding') == 'chunked':
+        size = 0
+        while chunk_size := int((await reader.readline()).split(b';')[0], 16):
+            await reader.readexactly(chunk_size + 2)  # data and CRLF
+            size += chunk_size
+        await reader.readline()  # CRLF after last chunk
+    else:  # body ends when the server closes the connection
+        size = len(await reader.read())
+        keep_alive = False
+    return int(status), size, keep_alive
+
+
+class Queries:
+    """deterministic stream of queries, stopping by count or deadline"""
+
+    def __init__(self, mix: list[str], seed: int,
+                 count: int | None, duration: float | None):
+        self.mix = mix
+        self.random = random.Random(seed)
+        self.remaining = count
+        self.deadline = perf_counter() + duration if duration else None
+
+    def next(self) -> str | None:
+        if self.remaining is not None:
+            if self.remaining == 0:
+                return None
+            self.remaining -= 1
+        if self.deadline is not None and perf_counter() >= self.deadline:
+            return None
+        return self.random.choice(self.mix)
+
+
+def percentile(ordered: list[float], pct: float) -> float:
+    """nearest-rank percentile of sorted, non-empty list"""
+    rank = max(1, round(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def report(args: argparse.Namespace, stats: Stats, elapsed: float) -> dict:
+    ordered = sorted(stats.latencies)
+    result = {
+        'protocol': args.protocol,
+        'target': f'{args.host}:{args.port}',
+        'connections': args.connections,
+        'python': platform.python_version(),
+        'requests': len(ordered),
+        'errors': dict(stats.errors),
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(len(ordered) / elapsed, 1) if elapsed else 0.0,
+        'received_bytes': stats.bytes,
+    }
+    if ordered:
+        result['latency_ms'] = {
+            'min': round(ordered[0] * 1000, 3),
+            'p50': round(percentile(ordered, 50) * 1000, 3),
+            'p95': round(percentile(ordered, 95) * 1000, 3),
+            'p99': round(percentile(ordered, 99) * 1000, 3),
+            'max': round(ordered[-1] * 1000, 3),
+        }
+    return result
+
+
+async def run(args: argparse.Namespace, mix: list[str]) -> dict:
+    stats = Stats()
+    count = None if args.duration else args.requests
+    queries = Queries(mix, args.seed, count, args.duration)
+    if args.protocol == 'tcp':
+        clients = [tcp_client(args.host, args.port, queries, stats)
+                   for _ in range(args.connections)]
+    else:
+        clients = [http_client(args.host, args.port, queries, stats, args.path)
+                   for _ in range(args.connections)]
+    t0 = perf_counter()
+    for outcome in await asyncio.gather(*clients, return_exceptions=True):
+        if isinstance(outcome, Exception):
+            stats.errors[type(outcome).__name__] += 1
+    return report(args, stats, perf_counter() - t0)
+
+
+def main(argv: list[str]) -> None:
+    parser = argparse.ArgumentParser(description='Load generator for Mojifinder servers.')
+    parser.add_argument('protocol', choices=['tcp', 'http'])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int,
+                        help='server port (default: 2323 for tcp, 8000 for http)')
+    parser.add_argument('--path', default='/search', help='HTTP search path')
+    parser.add_argument('-c', '--connections', type=int, default=10)
+    parser.add_argument('-n', '--requests', type=int, default=1000,
+                        help='total number of queries (default: 1000)')
+    parser.add_argument('-d', '--duration', type=float,
+                        help='run for this many seconds instead of -n queries')
+    parser.add_argument('--queries', type=argparse.FileType(encoding='utf-8'),
+                        help='file with one query per line (default: built-in mix)')
+    parser.add_argument('--seed', type=int, default=0, help='seed for the query order')
+    args = parser.parse_args(argv)
+    if args.port is None:
+        args.port = 2323 if args.protocol == 'tcp' else 8000
+    mix = QUERY_MIX
+    if args.queries:
+        mix = [line.strip() for line in args.queries if line.strip()]
+    result = asyncio.run(run(args, mix))
+    json.dump(result, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
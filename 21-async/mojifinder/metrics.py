@@ -0,0 +1,185 @@
+"""
+Lightweight metrics for the Mojifinder servers, in Prometheus text format.
+
+Metrics live in a ``Registry`` and are updated in place: observing
+a value costs one ``bisect`` and two additions, so instrumentation can
+stay on in production. There are no locks, because the servers update
+metrics only from the event loop thread: code that may run in other
+threads, like sync iterators given to ``StreamingResponse``, must not
+update metrics::
+
+    >>> registry = Registry()
+    >>> queries = registry.add(Counter('queries_total', 'Queries.', 'mode'))
+    >>> latency = registry.add(Histogram('latency_seconds', 'Latency.', [0.01, 0.1], 'stage'))
+    >>> queries.inc('plain'); queries.inc('plain'); queries.inc('prefix')
+    >>> for seconds in [0.005, 0.05, 0.5]:
+    ...     latency.observe(seconds, 'search')
+    >>> print(registry.render(), end='')
+    # HELP queries_total Queries.
+    # TYPE queries_total counter
+    queries_total{mode="plain"} 2
+    queries_total{mode="prefix"} 1
+    # HELP latency_seconds Latency.
+    # TYPE latency_seconds histogram
+    latency_seconds_bucket{stage="search",le="0.01"} 1
+    latency_seconds_bucket{stage="search",le="0.1"} 2
+    latency_seconds_bucket{stage="search",le="+Inf"} 3
+    latency_seconds_sum{stage="search"} 0.555
+    latency_seconds_count{stage="search"} 3
+
+``Histogram.time`` measures the duration of a ``with`` block::
+
+    >>> with latency.time('send'):
+    ...     pass
+    >>> latency.count('send')
+    1
+
+"""
+
+import asyncio
+import time
+from bisect import bisect_left
+from collections.abc import Callable, Iterator, Sequence
+from contextlib import contextmanager
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# seconds, from 50µs to 5s
+LATENCY_BUCKETS = [0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025,
+                   0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0]
+# number of characters found
+SIZE_BUCKETS = [0, 1, 10, 100, 1000, 10_000, 100_000]
+
+
+def labels_text(label: str | None, value: str, *extra: str) -> str:
+    pairs = [f'{label}="{value}"'] if label else []
+    pairs.extend(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name: str, doc: str, label: str | None = None):
+        self.name = name
+        self.doc = doc
+        self.label = label
+        self._values: dict[str, float] = {}
+
+    def inc(self, label_value: str = '', amount: float = 1) -> None:
+        self._values[label_value] = self._values.get(label_value, 0) + amount
+
+    def value(self, label_value: str = '') -> float:
+        return self._values.get(label_value, 0)
+
+    def samples(self) -> Iterator[str]:
+        for label_value, total in self._values.items():
+            yield f'{self.name}{labels_text(self.label, label_value)} {total:g}'
+
+
+class Gauge:
+    """value read from a callback when metrics are rendered"""
+
+    kind = 'gauge'
+
+    def __init__(self, name: str, doc: str, read: Callable[[], float]):
+        self.name = name
+        self.doc = doc
+        self.read = read
+
+    def samples(self) -> Iterator[str]:
+        yield f'{self.name} {self.read():g}'
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name: str, doc: str, buckets: Sequence[float],
+                 label: str | None = None):
+        self.name = name
+        self.doc = doc
+        self.buckets = sorted(buckets)
+        self.label = label
+        # label value -> counts per bucket, the last for +Inf, not cumulative
+        self._counts: dict[str, list[int]] = {}
+        self._sums: dict[str, float] = {}
+
+    def observe(self, value: float, label_value: str = '') -> None:
+        if (counts := self._counts.get(label_value)) is None:
+            counts = self._counts[label_value] = [0] * (len(self.buckets) + 1)
+            self._sums[label_value] = 0.0
+        counts[bisect_left(self.buckets, value)] += 1
+        self._sums[label_value] += value
+
+    @contextmanager
+    def time(self, label_value: str = '') -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, label_value)
+
+    def count(self, label_value: str = '') -> int:
+        return sum(self._counts.get(label_value, ()))
+
+    def samples(self) -> Iterator[str]:
+        bounds = [f'{bound:g}' for bound in self.buckets] + ['+Inf']
+        for label_value, counts in self._counts.items():
+            total = 0
+            for bound, count in zip(bounds, counts):
+                total += count
+                le = labels_text(self.label, label_value, f'le="{bound}"')
+                yield f'{self.name}_bucket{le} {total}'
+            labels = labels_text(self.label, label_value)
+            yield f'{self.name}_sum{labels} {self._sums[label_value]:g}'
+            yield f'{self.name}_count{labels} {total}'
+
+
+Metric = Counter | Gauge | Histogram
+
+
+class Registry:
+    def __init__(self) -> None:
+        self.metrics: list[Metric] = []
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.doc}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+# Metrics shared by the Mojifinder servers ---------------------------------
+
+REGISTRY = Registry()
+STAGE_SECONDS = REGISTRY.add(Histogram(
+    'mojifinder_stage_seconds', 'Time spent in each stage of a query.',
+    LATENCY_BUCKETS, 'stage'))
+QUERIES = REGISTRY.add(Counter(
+    'mojifinder_queries_total', 'Queries received, by search mode.', 'mode'))
+RESULTS = REGISTRY.add(Histogram(
+    'mojifinder_results', 'Characters found per query.', SIZE_BUCKETS))
+RESPONSES = REGISTRY.add(Counter(
+    'mojifinder_responses_total', 'Search responses, by source.', 'source'))
+
+
+async def metrics_handler(reader: asyncio.StreamReader,
+                          writer: asyncio.StreamWriter) -> None:
+    """answer any HTTP request with the metrics in REGISTRY"""
+    try:
+        await reader.readuntil(b'\r\n\r\n')
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+        writer.close()
+        return
+    body = REGISTRY.render().encode()
+    head = (f'HTTP/1.1 200 OK\r\nContent-Type: {CONTENT_TYPE}\r\n'
+            f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n')
+    writer.write(head.encode() + body)
+    await writer.drain()
+    writer.close()
@@ -0,0 +1,288 @@
+"""
+Compact posting lists for the Mojifinder index.
+
+Instead of a ``set`` of 1-character strings per word, ``CompactIndex``
+keeps each posting list as a sorted ``array('I')`` of code points,
+which takes 4 bytes per entry. Arguments are the same as for
+``charindex.InvertedIndex``::
+
+    >>> idx = CompactIndex(32, 128)
+    >>> idx.postings('DOLLAR')
+    array('I', [36])
+    >>> [chr(code) for code in idx.postings('SIGN')]
+    ['#', '$', '%', '+', '<', '=', '>']
+    >>> idx.postings('BRILLIG')
+    ()
+
+``.search_codes()`` returns the sorted code points matching all words
+in the query; ``.search()`` returns the same set of characters as
+``InvertedIndex.search``::
+
+    >>> idx.search_codes('latin small letter')[:3]
+    [97, 98, 99]
+    >>> idx.search('capital a')
+    {'A'}
+    >>> idx.search('')
+    set()
+
+With ``prefix=True``, the last word of the query may be incomplete.
+Matching words are found with ``bisect`` in the sorted ``words`` list::
+
+    >>> sorted(idx.search('dollar si', prefix=True))
+    ['$']
+    >>> sorted(idx.search('semi', prefix=True))
+    [';']
+    >>> idx.complete('s', 3)
+    ['SMALL', 'SIGN', 'S']
+
+With ``fuzzy=True``, words not in the index are replaced by the closest
+words, found through a trigram index of the vocabulary::
+
+    >>> idx.search('dolar sign')
+    set()
+    >>> idx.search('dolar sign', fuzzy=True)
+    {'$'}
+
+``intersect`` merges sorted lists starting from the shortest one,
+galloping over the longer lists::
+
+    >>> intersect([range(0, 1000, 3), [5, 6, 7, 600, 601], range(0, 1000, 2)])
+    [6, 600]
+    >>> intersect([[1, 2], []])
+    []
+    >>> union([[1, 5], [2, 5, 8]])
+    [1, 2, 5, 8]
+    >>> difference([1, 2, 5, 8], range(0, 100, 2))
+    [1, 5]
+
+"""
+
+import abc
+import sys
+import unicodedata
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+from collections.abc import Sequence
+from functools import cached_property
+from heapq import nlargest
+from itertools import chain
+
+from bitmaps import Bitmap
+from charindex import STOP_CODE, Char, tokenize
+from fuzzy import TrigramIndex
+
+Postings = Sequence[int]
+
+# Galloping pays off when the longer list is much longer than the
+# shorter one; for lists of similar size a hash probe is cheaper.
+GALLOP_RATIO = 32
+
+# Completions for prefixes matching more words than this are memoized.
+COMPLETION_SCAN = 256
+
+LAST_CHAR = chr(sys.maxunicode)
+
+# Posting lists at least this long are also kept as compressed bitmaps.
+DENSE_MIN = 2048
+
+
+def gallop(seq: Postings, target: int, lo: int = 0) -> int:
+    """return position of first item >= target in sorted seq[lo:]"""
+    size = len(seq)
+    hi = lo
+    step = 1
+    while hi < size and seq[hi] < target:
+        lo = hi + 1
+        hi += step
+        step *= 2
+    return bisect_left(seq, target, lo, min(hi, size))
+
+
+def intersect_pair(short: Postings, long: Postings) -> list[int]:
+    if len(long) < GALLOP_RATIO * len(short):
+        return sorted(set(short).intersection(long))
+    found = []
+    pos = 0
+    size = len(long)
+    for code in short:
+        pos = gallop(long, code, pos)
+        if pos == size:
+            break
+        if long[pos] == code:
+            found.append(code)
+            pos += 1
+    return found
+
+
+def intersect(lists: Sequence[Postings]) -> list[int]:
+    """return sorted list of items present in all sorted `lists`"""
+    if not lists:
+        return []
+    shortest, *others = sorted(lists, key=len)
+    found = list(shortest)
+    for other in others:
+        if not found:
+            break
+        found = intersect_pair(found, other)
+    return found
+
+
+def union(lists: Sequence[Postings]) -> list[int]:
+    """return sorted list of items present in any of the `lists`"""
+    return sorted(set().union(*lists))
+
+
+def difference(found: Postings, excluded: Postings) -> list[int]:
+    """return items of sorted `found` which are not in sorted `excluded`"""
+    short, long = sorted([found, excluded], key=len)
+    common = set(intersect_pair(short, long))
+    return [code for code in found if code not in common]
+
+
+class PostingIndex(abc.ABC):
+    """base class for indexes with sorted code point posting lists
+
+    Subclasses set `words` to the sorted list of indexed words, and
+    implement `_postings_at` to return the posting list of `words[i]`.
+    """
+
+    words: list[str]
+
+    def __init__(self) -> None:
+        self._completions: dict[tuple[str, int], list[str]] = {}
+        self._bitmaps: dict[str, Bitmap] = {}
+
+    @abc.abstractmethod
+    def _postings_at(self, i: int) -> Postings:
+        """return the posting list of `words[i]`"""
+
+    def postings(self, word: str) -> Postings:
+        """return sorted code points of characters with `word` in their names"""
+        i = bisect_left(self.words, word)
+        if i < len(self.words) and self.words[i] == word:
+            return self._postings_at(i)
+        return ()
+
+    def texts(self, code: int) -> list[str]:
+        """name and other indexed texts of character `code`"""
+        name = unicodedata.name(chr(code), '')
+        return [name] if name else []
+
+    def bitmap(self, word: str) -> Bitmap:
+        """return postings of `word` as a bitmap, built on first use"""
+        if (found := self._bitmaps.get(word)) is None:
+            found = self._bitmaps[word] = Bitmap.from_sorted(self.postings(word))
+        return found
+
+    def intersect_words(self, words: list[str]) -> list[int]:
+        """return sorted code points of characters with all `words`:
+        short posting lists are merged, long ones are ANDed as bitmaps"""
+        sizes = {word: len(self.postings(word)) for word in words}
+        dense = sorted((w for w in sizes if sizes[w] >= DENSE_MIN), key=sizes.get)
+        sparse = [self.postings(w) for w in sizes if sizes[w] < DENSE_MIN]
+        if not sparse and len(dense) > 1:
+            found_bits = self.bitmap(dense[0])
+            for word in dense[1:]:
+                found_bits &= self.bitmap(word)
+            return found_bits.to_list()
+        if not sparse:  # one word or none
+            return intersect([self.postings(w) for w in dense])
+        found = intersect(sparse)
+        for word in dense:
+            if not found:
+                break
+            members = self.bitmap(word)
+            found = [code for code in found if code in members]
+        return found
+
+    @cached_property
+    def trigrams(self) -> TrigramIndex:
+        """trigram index of `words`, built on first use;
+        ``loader.IndexLoader`` builds it before serving an index"""
+        return TrigramIndex(self.words)
+
+    def fuzzy_postings(self, word: str) -> Postings:
+        """return postings of `word` or, if not indexed, of the closest words"""
+        if postings := self.postings(word):
+            return postings
+        return union([self.postings(w) for w in self.trigrams.similar(word)])
+
+    def prefix_range(self, prefix: str) -> range:
+        """return positions in `words` of the words starting with `prefix`"""
+        lo = bisect_left(self.words, prefix)
+        hi = bisect_left(self.words, prefix + LAST_CHAR, lo)
+        return range(lo, hi)
+
+    def complete(self, prefix: str, limit: int = 10) -> list[str]:
+        """return up to `limit` words starting with `prefix`, most frequent first"""
+        prefix = prefix.upper()
+        key = (prefix, limit)
+        if key in self._completions:
+            return self._completions[key]
+        positions = self.prefix_range(prefix)
+        best = nlargest(limit, positions, key=lambda i: len(self._postings_at(i)))
+        found = [self.words[i] for i in best]
+        if len(positions) > COMPLETION_SCAN:  # only short prefixes get here
+            self._completions[key] = found
+        return found
+
+    def search_codes(self, query: str,
+                     prefix: bool = False, fuzzy: bool = False) -> list[int]:
+        """return sorted code points matching all words in query;
+        if `prefix` is true, the last word may be incomplete;
+        if `fuzzy` is true, unknown words match the closest indexed words"""
+        words = list(tokenize(query))
+        if fuzzy:
+            def match(words: list[str]) -> list[int]:
+                return intersect([self.fuzzy_postings(w) for w in words])
+        else:
+            match = self.intersect_words
+        if not (prefix and words):
+            return match(words)
+        *whole, partial = words
+        partial_lists = [self._postings_at(i) for i in self.prefix_range(partial)]
+        if whole:
+            found = match(whole)
+            if not found:
+                return []
+            return sorted(set(found).intersection(chain.from_iterable(partial_lists)))
+        return union(partial_lists)
+
+    def search(self, query: str,
+               prefix: bool = False, fuzzy: bool = False) -> set[Char]:
+        return {chr(code) for code in self.search_codes(query, prefix, fuzzy)}
+
+
+class CompactIndex(PostingIndex):
+    entries: dict[str, array]
+
+    def __init__(self, start: int = 32, stop: int = STOP_CODE):
+        super().__init__()
+        lists: defaultdict[str, list[int]] = defaultdict(list)
+        for code in range(start, stop):
+            name = unicodedata.name(chr(code), '')
+            for word in tokenize(name):
+                codes = lists[word]
+                if not codes or codes[-1] != code:  # some names repeat a word
+                    codes.append(code)
+        self.entries = {word: array('I', codes) for word, codes in lists.items()}
+        self.words = sorted(self.entries)
+
+    def _postings_at(self, i: int) -> Postings:
+        return self.entries[self.words[i]]
+
+
+def main(words: list[str]) -> None:
+    if not words:
+        print('Please give one or more words to search.')
+        sys.exit(2)  # command line usage error
+    index = CompactIndex()
+    codes = index.search_codes(' '.join(words))
+    for code in codes:
+        print(f'U+{code:04X}\t{chr(code)}\t{unicodedata.name(chr(code))}')
+    print('─' * 66, f'{len(codes)} found')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
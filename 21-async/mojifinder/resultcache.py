@@ -0,0 +1,124 @@
+"""
+Bounded LRU cache for serialized search results.
+
+``ResultCache`` keeps at most `maxsize` entries and `maxbytes` bytes
+of values, evicting the least recently used entries first. Values are
+usually ``bytes``; others must be given with their `size` in bytes::
+
+    >>> cache = ResultCache(maxsize=2)
+    >>> cache.put('CAT', b'["cat"]')
+    >>> cache.put('DOG', (b'["dog"]', 'next'), size=7)
+    >>> cache.get('CAT')
+    b'["cat"]'
+    >>> cache.put('EEL', b'["eel"]')  # evicts 'DOG', the least recently used
+    >>> cache.get('DOG') is None
+    True
+    >>> cache.stats()
+    {'size': 2, 'maxsize': 2, 'bytes': 14, 'hits': 1, 'misses': 1, 'evictions': 1, 'hit_rate': 0.5}
+
+``normalize`` makes equivalent queries share one cache key.
+Plain queries are sets of words, so case, spacing and order
+don't matter; in boolean queries only case and spacing are ignored::
+
+    >>> normalize('Cat  FACE') == normalize('face cat') == normalize('cat face cat')
+    True
+    >>> normalize('cat -face')
+    'CAT -FACE'
+    >>> normalize('fa cat', prefix=True)  # last word is a prefix, kept last
+    'FA CAT'
+
+``search_key`` returns the cache key of a search: the normalized words,
+then the search mode and page in separate fields, so no query text can
+stand for another mode or page::
+
+    >>> search_key('cat fa', prefix=True) == search_key('cat fa*')
+    False
+    >>> search_key('cat', fuzzy=True) == search_key('~cat')
+    False
+    >>> search_key('cat', cursor=0xFF, limit=5) == search_key('cat FF:5')
+    False
+    >>> search_key('cat fa', prefix=True)
+    SearchKey(words='CAT FA', prefix=True, fuzzy=False, cursor=None, limit=None)
+
+"""
+
+from collections import OrderedDict
+from collections.abc import Hashable
+from typing import Any, NamedTuple
+
+from charindex import tokenize
+
+BOOLEAN_CHARS = frozenset('"|()-')  # '-' also joins words of a phrase
+
+
+def normalize(query: str, prefix: bool = False) -> str:
+    words = query.split()
+    if prefix:
+        *whole, partial = list(tokenize(query)) or ['']
+        return ' '.join(sorted(set(whole)) + [partial])
+    if any(BOOLEAN_CHARS.intersection(word) for word in words):
+        return ' '.join(words).upper()
+    return ' '.join(sorted(set(tokenize(query))))
+
+
+class SearchKey(NamedTuple):
+    words: str  # from normalize
+    prefix: bool
+    fuzzy: bool
+    cursor: int | None  # last code point of the previous page
+    limit: int | None
+
+
+def search_key(query: str, prefix: bool = False, fuzzy: bool = False,
+               cursor: int | None = None, limit: int | None = None) -> SearchKey:
+    return SearchKey(normalize(query, prefix), prefix, fuzzy, cursor, limit)
+
+
+class ResultCache:
+    def __init__(self, maxsize: int = 1024, maxbytes: int = 64 * 2**20):
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self._data: OrderedDict[Hashable, tuple[Any, int]] = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Any:
+        try:
+            value, _ = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: Hashable, value: Any, size: int | None = None) -> None:
+        if size is None:
+            size = len(value)
+        if size > self.maxbytes:
+            return  # would evict everything else
+        if key in self._data:
+            self.bytes -= self._data.pop(key)[1]
+        self._data[key] = (value, size)
+        self.bytes += size
+        while len(self._data) > self.maxsize or self.bytes > self.maxbytes:
+            _, (_, evicted_size) = self._data.popitem(last=False)
+            self.bytes -= evicted_size
+            self.evictions += 1
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict[str, int | float]:
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'bytes': self.bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,129 @@
+"""
+Sources of searchable text for the Mojifinder index.
+
+A source yields ``(code, text)`` pairs: each word of `text` becomes
+a search term for the character with that code. ``UnicodeNames`` gives
+the character names; ``DataFile`` reads a file of extra texts, like
+the bundled ``data/aliases.txt`` and ``data/keywords.txt``::
+
+    >>> names, aliases, keywords = DEFAULT_SOURCES
+    >>> list(names.texts(36, 38))
+    [(36, 'DOLLAR SIGN'), (37, 'PERCENT SIGN')]
+    >>> [text for code, text in aliases.texts(0xFEFF, 0xFF00)]
+    ['BYTE ORDER MARK', 'BOM', 'ZWNBSP']
+    >>> [text for code, text in keywords.texts(0x1F60D, 0x1F60E)]
+    ['heart eyes', 'love', 'crush']
+
+``SourceIndex`` merges the words of all sources in one inverted index.
+Texts other than names are kept in ``extras``, to check phrases::
+
+    >>> idx = SourceIndex(0x1F600, 0x1F650)
+    >>> sorted(idx.search('smiley'))
+    ['😀', '😃', '😄', '🙂']
+    >>> idx.extras[0x1F60D]
+    ['heart eyes', 'love', 'crush']
+
+Characters without a name are not indexed, because they would have
+no name to display: ``data/aliases.txt`` may be replaced by the full
+``NameAliases.txt``, whose aliases for control characters are skipped.
+
+The ``digest`` of a list of sources changes whenever their data
+changes, so an index file built from older data can be detected::
+
+    >>> len(sources_digest(DEFAULT_SOURCES))
+    16
+
+"""
+
+import unicodedata
+from collections import defaultdict
+from collections.abc import Iterator, Sequence
+from hashlib import blake2b
+from pathlib import Path
+from typing import Protocol
+
+from charindex import STOP_CODE, InvertedIndex, tokenize
+
+DATA_PATH = Path(__file__).parent.absolute() / 'data'
+DIGEST_SIZE = 16
+
+
+class Source(Protocol):
+    def texts(self, start: int, stop: int) -> Iterator[tuple[int, str]]:
+        """yield (code, text) pairs for codes in range(start, stop)"""
+
+    def fingerprint(self) -> bytes:
+        """bytes that change whenever the texts change"""
+
+
+class UnicodeNames:
+    def texts(self, start: int, stop: int) -> Iterator[tuple[int, str]]:
+        for code in range(start, stop):
+            if name := unicodedata.name(chr(code), ''):
+                yield code, name
+
+    def fingerprint(self) -> bytes:
+        return f'unicodedata {unicodedata.unidata_version}'.encode()
+
+
+class DataFile:
+    """texts from lines like ``1F60D; heart eyes | love  # comment``;
+    the second field may hold several texts, separated by ``|``"""
+
+    def __init__(self, path: Path):
+        self.path = path
+
+    def texts(self, start: int, stop: int) -> Iterator[tuple[int, str]]:
+        with open(self.path, encoding='utf-8') as fp:
+            for line in fp:
+                fields = line.partition('#')[0].split(';')
+                if len(fields) < 2 or ' ' in fields[0].strip():
+                    continue  # blank line, comment, or character sequence
+                code = int(fields[0], 16)
+                if start <= code < stop:
+                    for text in fields[1].split('|'):
+                        if text := text.strip():
+                            yield code, text
+
+    def fingerprint(self) -> bytes:
+        return self.path.name.encode() + self.path.read_bytes()
+
+
+DEFAULT_SOURCES: list[Source] = [
+    UnicodeNames(),
+    DataFile(DATA_PATH / 'aliases.txt'),
+    DataFile(DATA_PATH / 'keywords.txt'),
+]
+
+
+def sources_digest(sources: Sequence[Source]) -> bytes:
+    digest = blake2b(digest_size=DIGEST_SIZE)
+    for source in sources:
+        digest.update(source.fingerprint())
+    return digest.digest()
+
+
+class SourceIndex(InvertedIndex):
+    """``InvertedIndex`` of the texts of several sources;
+    the first source must provide the character names"""
+
+    extras: dict[int, list[str]]
+
+    def __init__(self, start: int = 32, stop: int = STOP_CODE,
+                 sources: Sequence[Source] = DEFAULT_SOURCES):
+        self.entries = defaultdict(set)
+        self.extras = {}
+        self.digest = sources_digest(sources)
+        names, *others = sources
+        for code, text in names.texts(start, stop):
+            self.add(code, text)
+        for source in others:
+            for code, text in source.texts(start, stop):
+                if unicodedata.name(chr(code), ''):
+                    self.extras.setdefault(code, []).append(text)
+                    self.add(code, text)
+
+    def add(self, code: int, text: str) -> None:
+        char = chr(code)
+        for word in tokenize(text):
+            self.entries[word].add(char)
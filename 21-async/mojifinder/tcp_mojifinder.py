@@ -1,78 +1,299 @@
 #!/usr/bin/env python3
 
 # tag::TCP_MOJIFINDER_TOP[]
+import argparse
 import asyncio
 import functools
+import logging
+import os
+import queue
+import signal
+import socket
 import sys
+import time
 from asyncio.trsock import TransportSocket
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from logging.handlers import QueueHandler, QueueListener
 from typing import cast
 
-from charindex import InvertedIndex, format_results  # <1>
+from indexfile import MappedIndex, build  # <1>
+from loader import IndexLoader
+from metrics import QUERIES, RESPONSES, RESULTS, STAGE_SECONDS, metrics_handler
 
 CRLF = b'\r\n'
 PROMPT = b'?> '
+BATCH_LINES = 256  # most result lines sent in one write
+BATCH_BYTES = 64 * 1024  # drain the writer after sending this much
+RESTART_DELAY = 1.0  # seconds: minimum uptime before a worker is restarted at once
+MAX_QUERY_BYTES = 1024  # longer lines close the connection
+LOG_QUEUE_SIZE = 10_000  # log records beyond this are dropped, not awaited
 
-async def finder(index: InvertedIndex,          # <2>
+log = logging.getLogger('mojifinder')
+
+ClientHandler = Callable[[asyncio.StreamReader, asyncio.StreamWriter], Awaitable[None]]
+
+@dataclass
+class Limits:
+    max_clients: int = 1000  # more connections get a busy message
+    idle_timeout: float = 300.0  # seconds waiting for the next query
+    read_timeout: float = 10.0  # seconds to finish a query line once started
+    write_timeout: float = 30.0  # seconds for a slow client to accept a batch
+    max_response: int = 4 * 2**20  # bytes of result lines per query
+
+async def finder(loader: IndexLoader,           # <2>
+                 limits: Limits,
                  reader: asyncio.StreamReader,
                  writer: asyncio.StreamWriter) -> None:
     client = writer.get_extra_info('peername')  # <3>
-    while True:  # <4>
-        writer.write(PROMPT)  # can't await!  # <5>
-        await writer.drain()  # must await!  # <6>
-        data = await reader.readline()  # <7>
-        if not data:  # <8>
-            break
-        try:
-            query = data.decode().strip()  # <9>
-        except UnicodeDecodeError:  # <10>
-            query = '\x00'
-        print(f' From {client}: {query!r}')  # <11>
-        if query:
-            if ord(query[:1]) < 32:  # <12>
+    # make drain() wait while a batch is still buffered for a slow client
+    writer.transport.set_write_buffer_limits(high=BATCH_BYTES)
+    if not loader.ready:
+        writer.write(f'# {loader.banner()}'.encode() + CRLF)
+    try:
+        while loader.index is not None:  # <4>
+            writer.write(PROMPT)  # can't await!  # <5>
+            await asyncio.wait_for(writer.drain(), limits.write_timeout)  # must await!  # <6>
+            data = await read_query(reader, limits)  # <7>
+            if not data:  # <8>
                 break
-            results = await search(query, index, writer)  # <13>
-            print(f'   To {client}: {results} results.')  # <14>
+            try:
+                query = data.decode().strip()  # <9>
+            except UnicodeDecodeError:  # <10>
+                query = '\x00'
+            log.info(' From %s: %r', client, query)  # <11>
+            if query:
+                if ord(query[:1]) < 32:  # <12>
+                    break
+                results = await search(query, loader.index, writer, limits)  # <13>
+                log.info('   To %s: %s results.', client, results)  # <14>
+    except TimeoutError:
+        log.info('Timeout %s.', client)
+    except (ValueError, ConnectionError) as exc:  # ValueError: line too long
+        log.info('Dropping %s: %r', client, exc)
 
     writer.close()  # <15>
-    await writer.wait_closed()  # <16>
-    print(f'Close {client}.')  # <17>
+    try:
+        await writer.wait_closed()  # <16>
+    except ConnectionError:
+        pass
+    log.info('Close %s.', client)  # <17>
 # end::TCP_MOJIFINDER_TOP[]
 
+async def read_query(reader: asyncio.StreamReader, limits: Limits) -> bytes:
+    """wait up to `idle_timeout` for a query to start, then
+    up to `read_timeout` for the rest of its line"""
+    head = await asyncio.wait_for(reader.read(1), limits.idle_timeout)
+    if head in (b'', b'\n'):
+        return head
+    rest = await asyncio.wait_for(reader.readline(), limits.read_timeout)
+    return head + rest
+
+async def admit(slots: asyncio.Semaphore, handler: ClientHandler,
+                reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    """run `handler` if one of the `slots` is free, else refuse the client"""
+    if slots.locked():
+        log.warning('Busy: refusing %s.', writer.get_extra_info('peername'))
+        writer.write(b'# Server busy, please try again later.' + CRLF)
+        writer.close()
+        return
+    async with slots:
+        await handler(reader, writer)
+
 # tag::TCP_MOJIFINDER_SEARCH[]
 async def search(query: str,  # <1>
-                 index: InvertedIndex,
-                 writer: asyncio.StreamWriter) -> int:
-    chars = index.search(query)  # <2>
-    lines = (line.encode() + CRLF for line  # <3>
-                in format_results(chars))
-    writer.writelines(lines)  # <4>
-    await writer.drain()      # <5>
-    status_line = f'{"─" * 66} {len(chars)} found'  # <6>
-    writer.write(status_line.encode() + CRLF)
-    await writer.drain()
-    return len(chars)
+                 index: MappedIndex,
+                 writer: asyncio.StreamWriter,
+                 limits: Limits) -> int:
+    QUERIES.inc('exact')
+    RESPONSES.inc('index')
+    with STAGE_SECONDS.time('search'):
+        codes = index.search_codes(query)  # <2>
+    RESULTS.observe(len(codes))
+    with STAGE_SECONDS.time('send'):  # includes waiting for slow clients
+        pending = sent = 0
+        for lines in index.lines(codes, BATCH_LINES):  # <3>
+            truncated = sent + len(lines) > limits.max_response
+            if truncated:
+                lines = whole_lines(lines, limits.max_response - sent)
+            writer.write(lines)  # <4>
+            pending += len(lines)
+            sent += len(lines)
+            if truncated:
+                writer.write(f'# Response truncated at {sent} bytes.'.encode() + CRLF)
+                break
+            if pending >= BATCH_BYTES:
+                await asyncio.wait_for(writer.drain(), limits.write_timeout)  # <5>
+                pending = 0
+        status_line = f'{"─" * 66} {len(codes)} found'  # <6>
+        writer.write(status_line.encode() + CRLF)
+        await asyncio.wait_for(writer.drain(), limits.write_timeout)
+    return len(codes)
 # end::TCP_MOJIFINDER_SEARCH[]
 
+def whole_lines(lines: memoryview, max_bytes: int) -> memoryview:
+    """longest prefix of `lines` with complete lines only, up to `max_bytes`"""
+    end = bytes(lines[:max_bytes]).rfind(b'\n') + 1
+    return lines[:end]
+
+class DroppingQueueHandler(QueueHandler):
+    """never block the event loop: drop records when the queue is full"""
+
+    dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+def start_logging(level: int = logging.INFO) -> QueueListener:
+    """send `log` records through a queue to a thread writing stdout"""
+    records: queue.Queue = queue.Queue(LOG_QUEUE_SIZE)
+    log.addHandler(DroppingQueueHandler(records))
+    log.setLevel(level)
+    log.propagate = False
+    listener = QueueListener(records, logging.StreamHandler(sys.stdout))
+    listener.start()
+    return listener
+
+def stop_logging(listener: QueueListener) -> None:
+    """write pending records, report any records dropped, and send
+    later records to the default handlers again"""
+    listener.stop()
+    for handler in log.handlers[:]:
+        if isinstance(handler, DroppingQueueHandler):
+            log.removeHandler(handler)
+            if handler.dropped:
+                print(f'{handler.dropped} log records dropped: the log queue was full.')
+    log.propagate = True
+
 # tag::TCP_MOJIFINDER_MAIN[]
-async def supervisor(index: InvertedIndex, host: str, port: int) -> None:
+async def supervisor(loader: IndexLoader, limits: Limits, host: str, port: int,
+                     reuse_port: bool = False, metrics_port: int | None = None) -> None:
+    slots = asyncio.Semaphore(limits.max_clients)
     server = await asyncio.start_server(    # <1>
-        functools.partial(finder, index),   # <2>
-        host, port)                         # <3>
+        functools.partial(admit, slots, functools.partial(finder, loader, limits)),  # <2>
+        host, port, reuse_port=reuse_port,  # <3>
+        limit=MAX_QUERY_BYTES)
 
     socket_list = cast(tuple[TransportSocket, ...], server.sockets)  # <4>
     addr = socket_list[0].getsockname()
     print(f'Serving on {addr}. Hit CTRL-C to stop.')  # <5>
-    await server.serve_forever()  # <6>
+    if metrics_port:  # the event loop keeps a reference to this server
+        await asyncio.start_server(metrics_handler, host, metrics_port)
+        print(f'Metrics on http://{host}:{metrics_port}/metrics')
+    loading = asyncio.create_task(load_index(loader))
+    try:
+        await server.serve_forever()  # <6>
+    finally:
+        loading.cancel()
 
-def main(host: str = '127.0.0.1', port_arg: str = '2323'):
+async def load_index(loader: IndexLoader) -> None:
+    if not loader.ready:
+        log.info('Loading index in the background.')
+    try:
+        await loader.run()
+    except Exception:  # clients see loader.banner() with the error
+        log.exception('Index build failed.')
+        return
+    log.info('Index ready.')
+
+def main(host: str = '127.0.0.1', port_arg: str = '2323', workers: int = 1,
+         limits: Limits | None = None, metrics_port: int | None = None):
     port = int(port_arg)
-    print('Building index.')
-    index = InvertedIndex()                         # <7>
+    limits = limits or Limits()
+    loader = IndexLoader()                          # <7>
+    if workers > 1:
+        print('Loading index.')
+        build()
+        run_workers(loader, limits, host, port, workers, metrics_port)
+        return
+    listener = start_logging()
     try:
-        asyncio.run(supervisor(index, host, port))  # <8>
-    except KeyboardInterrupt:                       # <9>
+        asyncio.run(supervisor(loader, limits, host, port,  # <8>
+                               metrics_port=metrics_port))
+    except KeyboardInterrupt:                        # <9>
+        print('\nServer shut down.')
+    finally:
+        stop_logging(listener)
+# end::TCP_MOJIFINDER_MAIN[]
+
+def run_workers(loader: IndexLoader, limits: Limits, host: str, port: int,
+                workers: int, metrics_port: int | None = None) -> None:
+    """fork `workers` servers sharing `port`, restarting any that exit
+
+    The index file is built before forking, and all workers map it,
+    sharing its pages. Metrics are per process: worker ``i`` serves
+    them on ``metrics_port + i``.
+    """
+    if not hasattr(socket, 'SO_REUSEPORT'):
+        sys.exit('--workers requires SO_REUSEPORT, not available on this platform.')
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    started: dict[int, tuple[int, float]] = {}  # pid -> worker number, start time
+
+    def spawn(number: int) -> None:
+        if pid := os.fork():
+            started[pid] = number, time.monotonic()
+            return
+        code = 1
+        try:  # the child must never return into the loop below
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            listener = start_logging()  # threads don't survive fork
+            try:
+                worker_metrics_port = metrics_port + number if metrics_port else None
+                asyncio.run(supervisor(loader, limits, host, port, reuse_port=True,
+                                       metrics_port=worker_metrics_port))
+            except KeyboardInterrupt:
+                pass
+            finally:
+                stop_logging(listener)
+            code = 0
+        except BaseException:
+            log.exception('Worker %d failed.', number)
+        finally:
+            os._exit(code)
+
+    for number in range(workers):
+        spawn(number)
+    try:
+        while started:
+            pid, status = os.wait()
+            number, start_time = started.pop(pid)
+            uptime = time.monotonic() - start_time
+            code = os.waitstatus_to_exitcode(status)
+            print(f'Worker {pid} exited with status {code}; restarting.')
+            if uptime < RESTART_DELAY:  # don't spin if workers crash on start
+                time.sleep(RESTART_DELAY)
+            spawn(number)
+    except KeyboardInterrupt:
+        for pid in started:
+            os.kill(pid, signal.SIGTERM)
+        for pid in started:
+            os.waitpid(pid, 0)
         print('\nServer shut down.')
 
 if __name__ == '__main__':
-    main(*sys.argv[1:])
-# end::TCP_MOJIFINDER_MAIN[]
+    parser = argparse.ArgumentParser(description='Unicode character search server.')
+    parser.add_argument('host', nargs='?', default='127.0.0.1')
+    parser.add_argument('port', nargs='?', default='2323')
+    parser.add_argument('--workers', type=int, default=1, metavar='N',
+                        help='number of server processes sharing the port')
+    defaults = Limits()
+    parser.add_argument('--max-clients', type=int, default=defaults.max_clients,
+                        help='concurrent connections per process (default: %(default)s)')
+    parser.add_argument('--idle-timeout', type=float, default=defaults.idle_timeout,
+                        help='seconds to wait for a query (default: %(default)s)')
+    parser.add_argument('--read-timeout', type=float, default=defaults.read_timeout,
+                        help='seconds to finish sending a query (default: %(default)s)')
+    parser.add_argument('--write-timeout', type=float, default=defaults.write_timeout,
+                        help='seconds for a client to read a batch (default: %(default)s)')
+    parser.add_argument('--max-response', type=int, default=defaults.max_response,
+                        metavar='BYTES',
+                        help='result bytes sent per query (default: %(default)s)')
+    parser.add_argument('--metrics-port', type=int, metavar='PORT',
+                        help='serve Prometheus metrics over HTTP on this port')
+    args = parser.parse_args()
+    limits = Limits(args.max_clients, args.idle_timeout, args.read_timeout,
+                    args.write_timeout, args.max_response)
+    main(args.host, args.port, args.workers, limits, args.metrics_port)
@@ -0,0 +1,45 @@
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from web_mojifinder import app
+
+LOAD_TIMEOUT = 120  # seconds, in case the index file must be built
+
+
+@pytest.fixture(scope='module')
+def client():
+    with TestClient(app) as client:
+        deadline = time.monotonic() + LOAD_TIMEOUT
+        while client.get('/ready').status_code != 200:
+            assert time.monotonic() < deadline, 'index not loaded'
+            time.sleep(0.1)
+        yield client
+
+
+@pytest.mark.parametrize('params, other_params', [
+    ({'q': 'cat fa*'}, {'q': 'cat fa', 'prefix': 1}),
+    ({'q': '~cat'}, {'q': 'cat', 'fuzzy': 1}),
+    ({'q': 'cat FF:5'}, {'q': 'cat', 'cursor': 'FF', 'limit': 5}),
+    ({'q': 'cat', 'limit': 5}, {'q': 'cat', 'limit': 6}),
+])
+def test_distinct_requests_have_distinct_etags(client, params, other_params):
+    etag = client.get('/search', params=params).headers['ETag']
+    other_etag = client.get('/search', params=other_params).headers['ETag']
+    assert etag != other_etag
+
+
+def test_equivalent_requests_share_etag(client):
+    response = client.get('/search', params={'q': 'Cat  FACE', 'cursor': 'ff', 'limit': 5})
+    other = client.get('/search', params={'q': 'face cat', 'cursor': 'FF', 'limit': 5})
+    assert response.headers['ETag'] == other.headers['ETag']
+    assert response.json() == other.json()
+
+
+def test_cached_results_not_served_for_other_mode(client):
+    client.get('/search', params={'q': 'cat fa*'})  # cached: no results
+    response = client.get('/search', params={'q': 'cat fa', 'prefix': 1})
+    assert len(response.json()) > 0
+    client.get('/search', params={'q': '~cat'})  # cached: no results
+    response = client.get('/search', params={'q': 'cat', 'fuzzy': 1})
+    assert len(response.json()) > 0
@@ -1,13 +1,31 @@
+import asyncio
+import json
+from bisect import bisect_right
+from collections.abc import AsyncIterator, Iterator
 from pathlib import Path
+from time import perf_counter
 from unicodedata import name
 
-from fastapi import FastAPI
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, Header, HTTPException, Query
+from fastapi.responses import (HTMLResponse, JSONResponse, PlainTextResponse,
+                               Response, StreamingResponse)
 from pydantic import BaseModel
 
-from charindex import InvertedIndex
+import boolquery
+from charindex import tokenize
+from httpcache import choose_encoding, etag_matches, make_etag, precompress
+from indexfile import MappedIndex
+from loader import IndexLoader
+from metrics import (CONTENT_TYPE, QUERIES, REGISTRY, RESPONSES, RESULTS,
+                     STAGE_SECONDS, Gauge)
+from resultcache import ResultCache, search_key
 
 STATIC_PATH = Path(__file__).parent.absolute() / 'static'  # <1>
+CACHE_SIZE = 1024  # search results kept serialized as JSON
+STREAM_BATCH = 512  # larger results are streamed in batches of this size
+# results change only when the index is rebuilt; the ETag tells when
+SEARCH_CACHE_CONTROL = 'public, max-age=86400'
+FORM_CACHE_CONTROL = 'public, max-age=3600'
 
 app = FastAPI(  # <2>
     title='Mojifinder Web',
@@ -19,18 +37,160 @@ class CharName(BaseModel):  # <3>
     name: str
 
 def init(app):  # <4>
-    app.state.index = InvertedIndex()
-    app.state.form = (STATIC_PATH / 'form.html').read_text()
+    app.state.loader = IndexLoader()
+    app.state.cache = ResultCache(CACHE_SIZE)
+    form = (STATIC_PATH / 'form.html').read_bytes()
+    app.state.form = {coding: (body, make_etag(form.decode(), coding))  # coding -> body, ETag
+                      for coding, body in precompress(form).items()}
 
 init(app)  # <5>
 
+REGISTRY.add(Gauge('mojifinder_cache_entries', 'Search results in the cache.',
+                   lambda: len(app.state.cache)))
+REGISTRY.add(Gauge('mojifinder_cache_bytes', 'Size of cached search results.',
+                   lambda: app.state.cache.bytes))
+REGISTRY.add(Gauge('mojifinder_cache_hit_ratio', 'Cache hits per lookup.',
+                   lambda: app.state.cache.stats()['hit_rate']))
+
+@app.on_event('startup')
+async def start_loading():
+    """build or map the index without delaying startup"""
+    app.state.loading = asyncio.create_task(app.state.loader.run())
+
+def current_index() -> MappedIndex:
+    if (index := app.state.loader.index) is None:
+        raise HTTPException(status_code=503, detail=app.state.loader.banner(),
+                            headers={'Retry-After': '1'})
+    return index
+
 @app.get('/search', response_model=list[CharName])  # <6>
-async def search(q: str):  # <7>
-    chars = sorted(app.state.index.search(q))
-    return ({'char': c, 'name': name(c)} for c in chars)  # <8>
+async def search(q: str, prefix: bool = False, fuzzy: bool = False,  # <7>
+                 limit: int | None = Query(None, ge=1), cursor: str | None = None,
+                 if_none_match: str | None = Header(None, include_in_schema=False)):
+    """Results are sorted by code point. With `limit`, the `X-Next-Cursor`
+    response header is the `cursor` argument to fetch the next page.
+    With `fuzzy`, misspelled words match the closest indexed words."""
+    QUERIES.inc('fuzzy' if fuzzy else 'prefix' if prefix else 'exact')
+    after = parse_cursor(cursor) if cursor else None
+    key = search_key(q, prefix, fuzzy, after, limit)
+    etag = make_etag(current_index().version, *map(str, key))
+    if etag_matches(if_none_match, etag):
+        RESPONSES.inc('not_modified')
+        return Response(status_code=304, headers=cache_headers(etag))
+    ready = app.state.loader.ready
+    with STAGE_SECONDS.time('cache'):
+        cached = app.state.cache.get(key) if ready else None
+    if cached is not None:
+        RESPONSES.inc('cache')
+        body, next_cursor = cached
+        return Response(body, media_type='application/json',
+                        headers=result_headers(etag, next_cursor))
+    RESPONSES.inc('index')
+    with STAGE_SECONDS.time('search'):  # tokenize, plan, intersect
+        codes = find_codes(q, prefix, fuzzy)
+    RESULTS.observe(len(codes))
+    if after is not None:
+        codes = codes[bisect_right(codes, after):]
+    next_cursor = None
+    if limit and len(codes) > limit:
+        codes = codes[:limit]
+        next_cursor = f'{codes[-1]:X}'
+    if len(codes) > STREAM_BATCH:  # too big to cache
+        return StreamingResponse(stream_chunks(codes), media_type='application/json',
+                                 headers=result_headers(etag, next_cursor))
+    body = b''.join(json_chunks(codes))
+    if ready:  # don't cache results from a partial index
+        app.state.cache.put(key, (body, next_cursor), size=len(body))
+    return Response(body, media_type='application/json',
+                    headers=result_headers(etag, next_cursor))
+
+def find_codes(q: str, prefix: bool, fuzzy: bool) -> list[int]:
+    index = current_index()
+    if prefix or fuzzy:  # boolean operators are not supported in these modes
+        return index.search_codes(q, prefix, fuzzy)
+    try:
+        return boolquery.search_codes(index, q)
+    except boolquery.QueryError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+def parse_cursor(cursor: str) -> int:
+    try:
+        return int(cursor, 16)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f'invalid cursor: {cursor!r}')
+
+def cache_headers(etag: str) -> dict[str, str]:
+    if app.state.loader.ready:
+        return {'ETag': etag, 'Cache-Control': SEARCH_CACHE_CONTROL}
+    # a partial index has its own ETag, but revalidate: the full one is coming
+    return {'ETag': etag, 'Cache-Control': 'no-cache',
+            'X-Index-State': app.state.loader.state}
+
+def result_headers(etag: str, next_cursor: str | None) -> dict[str, str]:
+    headers = cache_headers(etag)
+    if next_cursor:
+        headers['X-Next-Cursor'] = next_cursor
+    return headers
+
+def json_chunks(codes: list[int]) -> Iterator[bytes]:
+    """serialize results as a JSON array, STREAM_BATCH items at a time"""
+    names_time = json_time = 0.0  # excluding time spent by the consumer
+    yield b'['
+    for start in range(0, len(codes), STREAM_BATCH):
+        t0 = perf_counter()
+        chars = map(chr, codes[start:start + STREAM_BATCH])
+        results = [{'char': c, 'name': name(c)} for c in chars]  # <8>
+        t1 = perf_counter()
+        chunk = json.dumps(results, ensure_ascii=False, separators=(',', ':'))
+        chunk_bytes = (',' if start else '').encode() + chunk[1:-1].encode()
+        names_time += t1 - t0
+        json_time += perf_counter() - t1
+        yield chunk_bytes
+    yield b']'
+    STAGE_SECONDS.observe(names_time, 'names')
+    STAGE_SECONDS.observe(json_time, 'serialize')
+
+async def stream_chunks(codes: list[int]) -> AsyncIterator[bytes]:
+    """json_chunks on the event loop thread: Starlette would iterate
+    a sync iterator in a worker thread, updating metrics there"""
+    for chunk in json_chunks(codes):
+        yield chunk
+
+@app.get('/stats')
+async def stats():
+    return {'cache': app.state.cache.stats()}
+
+@app.get('/metrics', response_class=PlainTextResponse, include_in_schema=False)
+async def metrics():
+    """Prometheus text exposition format"""
+    return PlainTextResponse(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+@app.get('/complete', response_model=list[str])
+async def complete(q: str, limit: int = Query(10, ge=1, le=100)):
+    words = list(tokenize(q))
+    if not words or q[-1].isspace():  # last word is complete
+        return []
+    return current_index().complete(words[-1], limit)
+
+@app.get('/ready')
+async def ready():
+    """200 when the full index is loaded; 503 while loading or if it failed"""
+    loader = app.state.loader
+    status = 200 if loader.ready else 503
+    return JSONResponse({'state': loader.state}, status_code=status)
 
 @app.get('/', response_class=HTMLResponse, include_in_schema=False)
-def form():  # <9>
-    return app.state.form
+def form(accept_encoding: str | None = Header(None),  # <9>
+         if_none_match: str | None = Header(None)):
+    """serve the form precompressed, if the client accepts it"""
+    coding = choose_encoding(accept_encoding, app.state.form) or 'identity'
+    body, etag = app.state.form[coding]
+    headers = {'ETag': etag, 'Cache-Control': FORM_CACHE_CONTROL,
+               'Vary': 'Accept-Encoding'}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    if coding != 'identity':
+        headers['Content-Encoding'] = coding
+    return HTMLResponse(body, headers=headers)
 
 # no main funcion  # <10>
\ No newline at end of file
@@ -5,7 +5,8 @@ import unicodedata
 
 from bottle import route, request, run, static_file
 
-from charindex import InvertedIndex
+from charindex import tokenize
+from indexfile import load
 
 index = {}
 
@@ -17,7 +18,10 @@ def form():
 @route('/search')
 def search():
     query = request.query['q']
-    chars = index.search(query)
+    prefix = request.query.get('prefix') == '1'
+    chars = sorted(index.search(query, prefix))
+    if (limit := request.query.get('limit', '')).isdigit():
+        chars = chars[:int(limit)]
     results = []
     for char in chars:
         name = unicodedata.name(char)
@@ -25,9 +29,18 @@ def search():
     return json.dumps(results).encode('UTF-8')
 
 
+@route('/complete')
+def complete():
+    query = request.query['q']
+    words = list(tokenize(query))
+    if not words or query[-1].isspace():  # last word is complete
+        return json.dumps([])
+    return json.dumps(index.complete(words[-1]))
+
+
 def main(port):
     global index
-    index = InvertedIndex()
+    index = load()
     run(host='localhost', port=port, debug=True)
 
 